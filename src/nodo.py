@@ -1,15 +1,21 @@
 from __future__ import annotations
 import os
 import json
+import time
 import asyncio
 from pathlib import Path
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Callable, Dict, List, Tuple, Any, Optional
 
 from dotenv import load_dotenv
 
-from src.storage.state import State
+from src.storage.state import State, SeenCache
+from src.storage.persistance import dump_state, load_state
+from src.transport.base import Transport
+from src.transport.hub import TransportHub
+from src.transport.loopback import LoopbackTransport
 from src.transport.redis_transport import RedisTransport, RedisSettings
-from src.services.fowarding import ForwardingService
+from src.services.fowarding import ForwardingService, ForwardingConfig
+from src.services.link_cost import LinkCostConfig
 from src.services.routing_lsr import RoutingLSRService, LSRConfig
 from src.protocol.builders import build_hello, build_info, build_message
 from src.utils.log import setup_logger
@@ -25,19 +31,26 @@ def _load_json(path: str) -> Dict[str, Any]:
 
 class Node:
     """
-    Nodo LSR con transporte Redis y servicios de Forwarding/LSR.
+    Nodo LSR con transporte Pub/Sub (Redis o loopback) y servicios de Forwarding/LSR.
 
-    - Lee .env para: REDIS_HOST, REDIS_PORT, REDIS_PWD, SECTION, TOPO, NODE, NAMES_PATH, TOPO_PATH, etc.
+    - Lee .env para: REDIS_HOST, REDIS_PORT, REDIS_PWD, SECTION, TOPO, NODE, NAMES_PATH, TOPO_PATH, TRANSPORT, etc.
     - Carga configs: names.json (id->canal), topo.json (vecinos)
     - Inicializa:
         State (vecinos directos, LSDB)
-        RedisTransport (canal propio)
+        Transport (canal propio): RedisTransport, LoopbackTransport o el que dé transport_factory
         RoutingLSRService (LSDB + Dijkstra + INFO)
         ForwardingService (recepción y reenvío)
     - Envía HELLO e INFO iniciales
     """
 
-    def __init__(self, env_path: Optional[str] = None) -> None:
+    def __init__(self,
+                 env_path: Optional[str] = None,
+                 node_id: Optional[str] = None,
+                 transport_factory: Optional[Callable[[str], Transport]] = None) -> None:
+        """
+        node_id: sobreescribe NODE del .env (útil para varios nodos en un proceso).
+        transport_factory: fn(canal_propio) -> Transport; si se omite se usa TRANSPORT del .env.
+        """
         if env_path:
             load_dotenv(env_path)
         else:
@@ -46,13 +59,38 @@ class Node:
         # ── Env ──────────────────────────────────────────────────────────────
         self.section = os.getenv("SECTION", "sec10")
         self.topo_id = os.getenv("TOPO", "topo1")
-        self.my_id = os.getenv("NODE", "A")
+        self.my_id = node_id or os.getenv("NODE", "A")
         self.names_path = os.getenv("NAMES_PATH", "./configs/names.json")
         self.topo_path = os.getenv("TOPO_PATH", "./configs/topo.json")
         self.hello_interval = float(os.getenv("HELLO_INTERVAL_SEC", "5"))
         self.info_interval = float(os.getenv("INFO_INTERVAL_SEC", "12"))
         self.hello_timeout = float(os.getenv("HELLO_TIMEOUT_SEC", "20"))
         self.log_level = os.getenv("LOG_LEVEL", "INFO")
+        self.transport_kind = os.getenv("TRANSPORT", "redis").lower()  # redis | hub | loopback
+        self.hub_pattern = os.getenv("HUB_PATTERN") or None  # p. ej. sec20.topologia1.*
+        self.wire_codec = os.getenv("WIRE_CODEC", "json").lower()  # json | binary
+        self.seen_max = int(os.getenv("SEEN_CACHE_MAX", "100000"))  # tope de ids vistos (de-dupe)
+        self.seen_compact = os.getenv("SEEN_CACHE_COMPACT", "0").lower() in ("1", "true", "yes")
+        # Warm start: snapshot de State (vacío = desactivado); "{node}" se reemplaza por el id
+        self.state_path = (os.getenv("STATE_PATH") or "").replace("{node}", self.my_id)
+        self.state_snapshot_sec = float(os.getenv("STATE_SNAPSHOT_SEC", "30"))
+        self.state_max_age = float(os.getenv("STATE_MAX_AGE_SEC", str(3 * self.info_interval)))
+        self.state_format = os.getenv("STATE_FORMAT", "json").lower()  # json | binary
+        # carril de control dedicado (<canal>.ctrl) para HELLO/INFO
+        self.control_channel = os.getenv("CONTROL_CHANNEL", "0").lower() in ("1", "true", "yes")
+        self.fwd_workers = int(os.getenv("FWD_WORKERS", "8"))
+        self.fwd_queue_depth = int(os.getenv("FWD_QUEUE_DEPTH", "256"))
+        # rate limiting del flooding (tokens/s; 0 = sin límite)
+        self.info_rate = float(os.getenv("INFO_RATE_PER_NEIGHBOR", "20"))
+        self.flood_rate = float(os.getenv("FLOOD_RATE_PER_NEIGHBOR", "20"))
+        self.flood_dst_rate = float(os.getenv("FLOOD_RATE_PER_DST", "1"))
+        # MESSAGE sin ruta: hold (retener hasta que haya ruta) | flood | drop
+        self.no_route_policy = os.getenv("NO_ROUTE_POLICY", "hold").lower()
+        self.hold_sec = float(os.getenv("HOLD_SEC", "1.0"))
+        # costos de enlace por RTT (eco de timestamps en HELLO); 0 = costos fijos en 1.0
+        self.rtt_costs = os.getenv("LINK_COST_RTT", "1").lower() in ("1", "true", "yes")
+        self.rtt_ms_per_unit = float(os.getenv("RTT_MS_PER_UNIT", "10"))
+        self._transport_factory = transport_factory
 
         # ── Redis settings ───────────────────────────────────────────────────
         self.redis_settings = RedisSettings(
@@ -61,6 +99,8 @@ class Node:
             password=os.getenv("REDIS_PWD", None),
             db=0,
             decode_responses=True,
+            codec=self.wire_codec,
+            control_channel=self.control_channel,
         )
 
         # ── Logger ───────────────────────────────────────────────────────────
@@ -68,7 +108,7 @@ class Node:
 
         # ── State y servicios (se crean en bootstrap) ────────────────────────
         self.state: Optional[State] = None
-        self.transport: Optional[RedisTransport] = None
+        self.transport: Optional[Transport] = None
         self.forwarding: Optional[ForwardingService] = None
         self.lsr: Optional[RoutingLSRService] = None
 
@@ -80,6 +120,7 @@ class Node:
 
         # ── Tasks locales ───────────────────────────────────────────────────
         self._hello_task: Optional[asyncio.Task] = None
+        self._snapshot_task: Optional[asyncio.Task] = None
 
     # ─────────────────────────────────────────────────────────────────────────
 
@@ -114,13 +155,30 @@ class Node:
         self.log.info(f"Vecinos de {self.my_id}: {self.neighbor_ids}")
         self.log.info(f"Canal propio: {self._my_channel()}")
 
+    def _make_transport(self) -> Transport:
+        channel = self._my_channel()
+        if self._transport_factory:
+            return self._transport_factory(channel)
+        if self.transport_kind == "loopback":
+            # bus en memoria compartido por todos los nodos del proceso
+            return LoopbackTransport(channel, logger_name=self.my_id, codec=self.wire_codec,
+                                     control_channel=self.control_channel,
+                                     data_queue_depth=self.redis_settings.data_queue_depth)
+        if self.transport_kind == "hub":
+            # una conexión Redis (pub + PubSub) compartida por todos los nodos del proceso
+            hub = TransportHub.shared(self.redis_settings, pattern=self.hub_pattern)
+            return hub.attach(channel, logger_name=self.my_id)
+        return RedisTransport(self.redis_settings, my_channel=channel, logger_name=self.my_id)
+
     async def _bootstrap_services(self) -> None:
         # Estado inicial (vecinos directos con costo 1.0)
-        self.state = State(node_id=self.my_id)
+        self.state = State(node_id=self.my_id,
+                           seen_cache=SeenCache(120, max_entries=self.seen_max, compact=self.seen_compact))
         await self.state.set_neighbors([(n, 1.0) for n in self.neighbor_ids])
+        snapshot = await self._load_snapshot()
 
         # Transporte
-        self.transport = RedisTransport(self.redis_settings, my_channel=self._my_channel(), logger_name=self.my_id)
+        self.transport = self._make_transport()
         await self.transport.connect()
 
         # LSR
@@ -132,17 +190,19 @@ class Node:
             cfg=LSRConfig(
                 hello_timeout_sec=self.hello_timeout,
                 info_interval_sec=self.info_interval,
-                on_change_debounce_sec=0.4,
+                spf_initial_delay_sec=0.4,
                 advertise_links_from_neighbors_table=True,  # LSP clásico
             ),
             logger_name=f"LSR-{self.my_id}",
         )
+        if snapshot.get("seq"):
+            self.lsr.restore_seq(snapshot["seq"])
         await self.lsr.start()
 
         # Forwarding con callback → LSR
-        async def _on_info(origin: str, view: dict) -> None:
-            # Forwarding dispara esto al recibir INFO
-            await self.lsr.on_info(origin, view)
+        async def _on_info(origin: str, view: dict, seq: Optional[int] = None, age: int = 0) -> bool:
+            # Forwarding dispara esto al recibir INFO; False = LSP vieja (no re-flood)
+            return await self.lsr.on_info(origin, view, seq=seq, age=age)
 
         self.forwarding = ForwardingService(
             state=self.state,
@@ -152,6 +212,16 @@ class Node:
             on_info_async=_on_info,
             hello_timeout_sec=self.hello_timeout,
             logger_name=f"FWD-{self.my_id}",
+            cfg=ForwardingConfig(
+                workers=self.fwd_workers,
+                worker_queue_depth=self.fwd_queue_depth,
+                info_rate_per_neighbor=self.info_rate,
+                flood_rate_per_neighbor=self.flood_rate,
+                flood_rate_per_dst=self.flood_dst_rate,
+                no_route_policy=self.no_route_policy,
+                hold_sec=self.hold_sec,
+                link_cost=LinkCostConfig(ms_per_unit=self.rtt_ms_per_unit) if self.rtt_costs else None,
+            ),
         )
         await self.forwarding.start()
 
@@ -160,18 +230,68 @@ class Node:
 
         # HELLO periódico (INFO periódico lo maneja LSR internamente)
         self._hello_task = asyncio.create_task(self._periodic_hello())
+        if self.state_path:
+            self._snapshot_task = asyncio.create_task(self._periodic_snapshot())
+
+    def _hello_codecs(self) -> Optional[List[str]]:
+        # anunciar binario solo si este nodo lo acepta; en JSON el HELLO va sin payload
+        if self.wire_codec == "binary":
+            return ["binary", "json"]
+        return None
+
+    def _build_hello(self) -> Dict[str, Any]:
+        assert self.transport is not None and self.state is not None
+        if self.rtt_costs:
+            now = time.monotonic()
+            pkt = build_hello(self.my_id, codecs=self._hello_codecs(), control=self.transport.control_channel,
+                              ts=now, echo=self.state.hello_echoes(now))
+        else:
+            pkt = build_hello(self.my_id, codecs=self._hello_codecs(), control=self.transport.control_channel)
+        return pkt.to_publish_dict()
 
     async def _emit_initial_control_packets(self) -> None:
         assert self.transport is not None
         # HELLO inicial
-        hello = build_hello(self.my_id).to_publish_dict()
-        await self.transport.broadcast(self.neighbor_map.values(), hello)
-        # INFO inicial (mis enlaces directos)
-        initial_links = {n: 1.0 for n in self.neighbor_ids}
-        info = build_info(self.my_id, initial_links).to_publish_dict()
+        await self.transport.broadcast(self.neighbor_map.values(), self._build_hello())
+        # INFO inicial (mis enlaces directos, con el costo vigente: 1.0 hasta medir RTT)
+        initial_links = {n: info.cost for n, info in self.state.neighbors.items()}
+        info = build_info(self.my_id, initial_links, seq=self.lsr.next_seq()).to_publish_dict()
         await self.transport.broadcast(self.neighbor_map.values(), info)
         self.log.info("HELLO/INFO iniciales enviados")
 
+    # ── Warm start ──────────────────────────────────────────────────────────
+
+    async def _load_snapshot(self) -> Dict[str, Any]:
+        """Carga el snapshot de STATE_PATH (si es válido y reciente) en State."""
+        if not self.state_path or not self.state:
+            return {}
+        try:
+            data = await asyncio.to_thread(load_state, self.state_path)
+        except (OSError, ValueError) as e:
+            self.log.warning(f"Snapshot ignorado: {e}")
+            return {}
+        if not data:
+            return {}
+        restored = await self.state.restore_snapshot(data, self.state_max_age)
+        self.log.info(f"Warm start desde {self.state_path}: {restored} LSPs, "
+                      f"{len(self.state.routing)} rutas")
+        return data
+
+    async def save_snapshot(self) -> None:
+        """Escribe el snapshot de State (+ secuencia LSR) de forma atómica."""
+        assert self.state is not None
+        data = await self.state.export_snapshot()
+        data["seq"] = self.lsr.seq if self.lsr else 0
+        try:
+            await asyncio.to_thread(dump_state, self.state_path, data, self.state_format)
+        except OSError as e:
+            self.log.error(f"No se pudo guardar el snapshot en {self.state_path}: {e}")
+
+    async def _periodic_snapshot(self) -> None:
+        while True:
+            await asyncio.sleep(self.state_snapshot_sec)
+            await self.save_snapshot()
+
     async def _periodic_hello(self) -> None:
         """
         Emite HELLO a vecinos cada HELLO_INTERVAL_SEC.
@@ -180,8 +300,7 @@ class Node:
         try:
             while True:
                 await asyncio.sleep(self.hello_interval)
-                pkt = build_hello(self.my_id).to_publish_dict()
-                await self.transport.broadcast(self.neighbor_map.values(), pkt)
+                await self.transport.broadcast(self.neighbor_map.values(), self._build_hello())
         except asyncio.CancelledError:
             return
 
@@ -199,16 +318,26 @@ class Node:
 
     async def stop(self) -> None:
         """
-        Detiene timers y cierra transporte.
+        Detiene timers, guarda el snapshot final (si hay STATE_PATH), anuncia el retiro
+        (LSP de edad máxima) y cierra transporte.
         """
-        if self._hello_task:
-            self._hello_task.cancel()
-            try:
-                await self._hello_task
-            except asyncio.CancelledError:
-                pass
+        for task in (self._hello_task, self._snapshot_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+        if self.state_path and self.state:
+            await self.save_snapshot()
 
         if self.lsr:
+            # avisar antes de desconectar: los demás convergen en un flood, sin timeouts
+            try:
+                await self.lsr.withdraw()
+            except Exception as e:
+                self.log.warning(f"No se pudo enviar la LSP de retiro: {e}")
             await self.lsr.stop()
 
         if self.forwarding:
@@ -221,24 +350,14 @@ class Node:
 
     async def send_message(self, dst: str, body: Any = "hola") -> None:
         """
-        Envía un MESSAGE a 'dst' usando ruteo (o flooding si no hay ruta).
-        Publica al canal del next-hop si existe; si no, broadcast a vecinos.
+        Envía un MESSAGE a 'dst' usando ruteo: lo entrega a ForwardingService.forward(),
+        que publica al canal del next-hop si hay ruta y si no aplica la política sin ruta
+        (retener hasta que aparezca, flooding controlado o descartar).
         """
-        assert self.transport is not None and self.state is not None
+        assert self.forwarding is not None
 
         pkt = build_message(self.my_id, dst, body).to_publish_dict()
-
-        # intentar ruta conocida
-        next_hop = await self.state.get_next_hop(dst)
-        if next_hop:
-            ch = self.neighbor_map.get(next_hop)
-            if ch:
-                await self.transport.publish_json(ch, pkt)
-                self.log.info(f"[CLI] MESSAGE {self.my_id}→{dst} via {next_hop}")
-                return
-
-        # sin ruta → flooding controlado (Forwarding hará de-dupe por msg_id)
-        await self.transport.broadcast(self.neighbor_map.values(), pkt)
+        await self.forwarding.forward(pkt)
         self.log.info(f"[CLI] MESSAGE {self.my_id}→{dst}")
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -1,6 +1,6 @@
 from __future__ import annotations
 import os
-from typing import Dict, Any, Union
+from typing import Dict, Any, List, Optional, Union
 from src.protocol.schema import (
     HelloPacket,
     InfoPacket,
@@ -18,11 +18,31 @@ def _base_headers() -> list[str]:
     return []
 
 
-def build_hello(my_id: str, ttl: int | None = None) -> HelloPacket:
+def build_hello(my_id: str,
+                ttl: int | None = None,
+                codecs: Optional[List[str]] = None,
+                control: bool = False,
+                ts: Optional[float] = None,
+                echo: Optional[Dict[str, List[float]]] = None) -> HelloPacket:
     """
     Crea un paquete HELLO para presentar vecinos.
     'to' es 'broadcast' por definición del grupo.
+    'codecs': codecs de cable que acepto (p.ej. ["binary","json"]); va en el payload para
+    que cada vecino negocie el binario.
+    'control': escucho HELLO/INFO en <mi canal>.ctrl (carril de control dedicado).
+    'ts' / 'echo': medición de RTT. ts = mi reloj al enviar; echo = {vecino: [su ts, retenido]},
+    el último ts de cada vecino y cuánto lo tuve antes de este HELLO.
+    Sin nada de eso, payload vacío (solo JSON, canal único).
     """
+    caps: Dict[str, Any] = {}
+    if codecs:
+        caps["codecs"] = list(codecs)
+    if control:
+        caps["ctrl"] = True
+    if ts is not None:
+        caps["ts"] = round(ts, 6)
+    if echo:
+        caps["echo"] = echo
     pkt = HelloPacket(
         proto=PROTO,
         type="hello",
@@ -30,19 +50,22 @@ def build_hello(my_id: str, ttl: int | None = None) -> HelloPacket:
         to="broadcast",
         ttl=DEFAULT_TTL if ttl is None else ttl,
         headers=_base_headers(),
-        payload=""
+        payload=caps or ""
     )
     return PacketFactory.ensure_trace(pkt, my_id)  # agrega trace_id si no existe
 
 
 def build_info(my_id: str,
                view: Dict[str, Union[int, float]],
-               ttl: int | None = None) -> InfoPacket:
+               ttl: int | None = None,
+               seq: int | None = None,
+               age: int = 0) -> InfoPacket:
     """
     Crea un paquete INFO con la vista local.
     'view' puede ser:
       - LSP (enlaces/costos): p.ej. {"B":1,"C":3}
       - Tabla hacia destinos: p.ej. {"A":3,"C":1,"J":2}
+    'seq' (creciente por origen) y 'age' permiten a la LSDB descartar LSPs viejas o repetidas.
     """
     pkt = InfoPacket(
         proto=PROTO,
@@ -51,7 +74,9 @@ def build_info(my_id: str,
         to="broadcast",
         ttl=DEFAULT_TTL if ttl is None else ttl,
         headers=_base_headers(),
-        payload=dict(view or {})
+        payload=dict(view or {}),
+        seq=seq,
+        age=age,
     )
     return PacketFactory.ensure_trace(pkt, my_id)
 
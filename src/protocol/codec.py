@@ -0,0 +1,333 @@
+from __future__ import annotations
+import json
+import re
+import struct
+import uuid
+from json.decoder import scanstring as _scanstring
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Codecs de cable soportados
+JSON = "json"
+BINARY = "binary"
+CODECS = (JSON, BINARY)
+
+# Formato binario (big-endian), pensado para los campos fijos del paquete:
+#
+#     magic(B)=0xB1  version(B)  type(B)  ttl(B)  flags(B)  timestamp(d)
+#     proto, from, to            → str16 (u16 largo + utf-8)
+#     msg_id                     → 16 bytes si es UUID (flag), si no str16
+#     trace_id                   → str16 (solo si flag)
+#     headers                    → count(B) + str16 * count
+#     payload                    → kind(B) + u32 largo + bytes (utf-8 si str, JSON si no)
+#     extras                     → u32 largo + JSON de claves fuera del layout (0 = ninguna)
+#
+# 0xB1 nunca inicia un texto UTF-8 válido, así que decode() distingue JSON/binario
+# mirando el primer byte.
+
+MAGIC = 0xB1
+VERSION = 1
+
+_HEAD = struct.Struct(">BBBBBd")
+_U16 = struct.Struct(">H")
+_U32 = struct.Struct(">I")
+
+_TYPE_CODES = {"hello": 0, "info": 1, "message": 2}
+_TYPE_NAMES = {v: k for k, v in _TYPE_CODES.items()}
+_TYPE_OTHER = 0xFF
+
+_FLAG_TRACE = 0x01
+_FLAG_UUID = 0x02
+
+_PAYLOAD_NONE = 0
+_PAYLOAD_STR = 1
+_PAYLOAD_JSON = 2
+
+_FIXED_KEYS = {"proto", "type", "from", "to", "ttl", "headers", "payload", "msg_id", "timestamp", "trace_id"}
+
+
+class RawPayload:
+    """
+    Payload opaco: slice crudo del paquete binario original, sin decodificar.
+    Un nodo de tránsito lo reenvía tal cual (binario) y solo se decodifica (value())
+    si hace falta: en el destino, o al re-serializar hacia un vecino JSON.
+    """
+    __slots__ = ("kind", "raw", "_value", "_decoded")
+
+    def __init__(self, kind: int, raw: Union[bytes, memoryview]) -> None:
+        self.kind = kind
+        self.raw = raw
+        self._value: Any = None
+        self._decoded = False
+
+    def value(self) -> Any:
+        if not self._decoded:
+            if self.kind == _PAYLOAD_NONE:
+                self._value = None
+            elif self.kind == _PAYLOAD_STR:
+                self._value = str(self.raw, "utf-8")
+            else:
+                self._value = json.loads(bytes(self.raw))
+            self._decoded = True
+        return self._value
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def __repr__(self) -> str:
+        return f"RawPayload(kind={self.kind}, {len(self.raw)} bytes)"
+
+
+def _json_default(o: Any) -> Any:
+    if isinstance(o, RawPayload):
+        return o.value()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+# -----------------------------
+# API
+# -----------------------------
+def encode(message: Union[Dict[str, Any], str], codec: str = JSON) -> Union[str, bytes]:
+    """
+    Serializa un paquete (dict con alias 'from') al codec pedido.
+    Un str se asume ya serializado y se devuelve tal cual.
+    """
+    if not isinstance(message, dict):
+        return message
+    if codec == BINARY:
+        return encode_binary(message)
+    return json.dumps(message, ensure_ascii=False, default=_json_default)
+
+
+def decode(raw: Union[str, bytes, bytearray, memoryview], lazy_payload: bool = False) -> Dict[str, Any]:
+    """
+    Deserializa un payload crudo detectando el codec (binario por magic byte, si no JSON).
+    lazy_payload: en binario deja el payload como RawPayload (sin decodificar).
+    Lanza ValueError si no es decodificable.
+    """
+    if is_binary(raw):
+        return decode_binary(raw, lazy_payload)
+    if isinstance(raw, (bytearray, memoryview)):
+        raw = bytes(raw)
+    data = json.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("el paquete JSON no es un objeto")
+    return data
+
+
+def is_binary(raw: Any) -> bool:
+    """True si el payload crudo es del codec binario (magic byte); si no, se trata como JSON."""
+    return isinstance(raw, (bytes, bytearray, memoryview)) and len(raw) > 0 and raw[0] == MAGIC
+
+
+_SCAN_TOKENS = re.compile(r'["{}\[\]]')
+_SCAN_WS = re.compile(r"[ \t\n\r]*")
+
+
+def _json_top_type(text: str) -> Optional[str]:
+    """
+    Valor de la clave "type" del objeto de nivel superior, sin decodificar el resto: salta
+    strings (scanstring, en C) y cuenta llaves/corchetes, así un "type" dentro del payload
+    no cuenta. Corta en cuanto lo encuentra (los builders lo ponen entre las primeras claves).
+    """
+    pos = 0
+    depth = 0
+    while True:
+        m = _SCAN_TOKENS.search(text, pos)
+        if m is None:
+            return None
+        c = m.group()
+        pos = m.end()
+        if c == '"':
+            try:
+                key, pos = _scanstring(text, pos)
+            except ValueError:
+                return None
+            if depth != 1:
+                continue
+            colon = _SCAN_WS.match(text, pos).end()
+            if not text.startswith(":", colon):
+                continue  # era un valor, no una clave
+            pos = colon + 1
+            if key != "type":
+                continue
+            start = _SCAN_WS.match(text, pos).end()
+            if not text.startswith('"', start):
+                return None
+            try:
+                return _scanstring(text, start + 1)[0]
+            except ValueError:
+                return None
+        elif c in "{[":
+            depth += 1
+        else:
+            depth -= 1
+            if depth <= 0:
+                return None
+
+
+def peek_type(raw: Union[str, bytes, bytearray, memoryview]) -> Optional[str]:
+    """
+    Tipo del paquete sin decodificarlo (para clasificar en carriles de prioridad):
+    binario → byte de tipo de la cabecera; JSON → clave "type" del objeto de nivel superior.
+    None si no se ve. Es una pista: el paquete se valida igual al decodificarlo.
+    """
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        if is_binary(raw):
+            return _TYPE_NAMES.get(raw[2]) if len(raw) > 2 else None
+        try:
+            raw = bytes(raw).decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+    return _json_top_type(raw)
+
+
+def materialize(pkt: Dict[str, Any]) -> Dict[str, Any]:
+    """Decodifica en sitio un payload RawPayload (si lo hay) y devuelve el mismo dict."""
+    payload = pkt.get("payload")
+    if isinstance(payload, RawPayload):
+        pkt["payload"] = payload.value()
+    return pkt
+
+
+# -----------------------------
+# Binario
+# -----------------------------
+def _put_str(out: List[bytes], s: str) -> None:
+    b = s.encode("utf-8")
+    out.append(_U16.pack(len(b)))
+    out.append(b)
+
+
+def _get_str(buf: memoryview, off: int) -> Tuple[str, int]:
+    (n,) = _U16.unpack_from(buf, off)
+    off += 2
+    return str(buf[off:off + n], "utf-8"), off + n
+
+
+def encode_binary(pkt: Dict[str, Any]) -> bytes:
+    t = str(pkt.get("type") or "")
+    tcode = _TYPE_CODES.get(t, _TYPE_OTHER)
+    extras = {k: v for k, v in pkt.items() if k not in _FIXED_KEYS}
+    if tcode == _TYPE_OTHER:
+        extras["type"] = t
+
+    msg_id = str(pkt.get("msg_id") or "")
+    trace_id = pkt.get("trace_id")
+    flags = 0
+    msg_uuid = None
+    if trace_id is not None:
+        flags |= _FLAG_TRACE
+    try:
+        msg_uuid = uuid.UUID(msg_id)
+        if str(msg_uuid) == msg_id:  # solo si vuelve idéntico al decodificar
+            flags |= _FLAG_UUID
+    except ValueError:
+        pass
+
+    out: List[bytes] = [_HEAD.pack(MAGIC, VERSION, tcode, int(pkt.get("ttl") or 0), flags,
+                                   float(pkt.get("timestamp") or 0.0))]
+    _put_str(out, str(pkt.get("proto") or ""))
+    _put_str(out, str(pkt.get("from") or ""))
+    _put_str(out, str(pkt.get("to") or ""))
+    if flags & _FLAG_UUID:
+        out.append(msg_uuid.bytes)
+    else:
+        _put_str(out, msg_id)
+    if flags & _FLAG_TRACE:
+        _put_str(out, str(trace_id))
+
+    headers = pkt.get("headers") or []
+    if isinstance(headers, dict):
+        headers = headers.get("path", []) or []
+    headers = [str(h) for h in headers][-255:]
+    out.append(bytes((len(headers),)))
+    for h in headers:
+        _put_str(out, h)
+
+    payload = pkt.get("payload")
+    if isinstance(payload, RawPayload):
+        # payload en tránsito: se copia el slice original sin decodificar
+        out.append(bytes((payload.kind,)))
+        out.append(_U32.pack(len(payload.raw)))
+        out.append(payload.raw)
+    elif payload is None:
+        out.append(bytes((_PAYLOAD_NONE,)))
+        out.append(_U32.pack(0))
+    else:
+        if isinstance(payload, str):
+            kind, body = _PAYLOAD_STR, payload.encode("utf-8")
+        else:
+            kind, body = _PAYLOAD_JSON, json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        out.append(bytes((kind,)))
+        out.append(_U32.pack(len(body)))
+        out.append(body)
+
+    if extras:
+        body = json.dumps(extras, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        out.append(_U32.pack(len(body)))
+        out.append(body)
+    else:
+        out.append(_U32.pack(0))
+    return b"".join(out)
+
+
+def decode_binary(raw: Union[bytes, bytearray, memoryview], lazy_payload: bool = False) -> Dict[str, Any]:
+    buf = memoryview(raw)
+    try:
+        magic, version, tcode, ttl, flags, ts = _HEAD.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"versión binaria no soportada: {version}")
+        off = _HEAD.size
+        proto, off = _get_str(buf, off)
+        frm, off = _get_str(buf, off)
+        to, off = _get_str(buf, off)
+        if flags & _FLAG_UUID:
+            msg_id = str(uuid.UUID(bytes=bytes(buf[off:off + 16])))
+            off += 16
+        else:
+            msg_id, off = _get_str(buf, off)
+        trace_id = None
+        if flags & _FLAG_TRACE:
+            trace_id, off = _get_str(buf, off)
+
+        count = buf[off]
+        off += 1
+        headers = []
+        for _ in range(count):
+            h, off = _get_str(buf, off)
+            headers.append(h)
+
+        kind = buf[off]
+        (n,) = _U32.unpack_from(buf, off + 1)
+        off += 5
+        body = buf[off:off + n]
+        off += n
+        if lazy_payload:
+            payload = RawPayload(kind, body)
+        elif kind == _PAYLOAD_NONE:
+            payload = None
+        elif kind == _PAYLOAD_STR:
+            payload = str(body, "utf-8")
+        else:
+            payload = json.loads(bytes(body))
+
+        (n,) = _U32.unpack_from(buf, off)
+        off += 4
+        extras = json.loads(bytes(buf[off:off + n])) if n else {}
+    except (struct.error, IndexError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"paquete binario truncado o inválido: {e}") from e
+
+    pkt: Dict[str, Any] = {
+        "proto": proto,
+        "type": _TYPE_NAMES.get(tcode, ""),
+        "from": frm,
+        "to": to,
+        "ttl": ttl,
+        "headers": headers,
+        "payload": payload,
+        "msg_id": msg_id,
+        "timestamp": ts,
+        "trace_id": trace_id,
+    }
+    pkt.update(extras)
+    return pkt
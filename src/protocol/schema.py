@@ -1,13 +1,17 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Literal, Optional, Union
-from pydantic import BaseModel, Field, field_validator
+from typing import Any, ClassVar, Dict, List, Literal, Optional, Tuple, Union
+from pydantic import BaseModel, Field, field_validator, model_validator
 from datetime import datetime, timezone
 import json  # <-- para normalizar payload string JSON
+from src.protocol.codec import materialize
 from src.utils.ids import generate_msg_id, generate_trace_id
 
 # Tipos permitidos en el protocolo "lsr"
 PacketType = Literal["hello", "info", "message"]
 
+# Edad máxima de un LSP (s): al llegar a este valor la LSP se considera retirada
+LSP_MAX_AGE = 3600
+
 class BasePacket(BaseModel):
     proto: Literal["lsr", "flooding"] = Field(default="lsr")  # admite ambos si quieres usar flooding
     type: PacketType
@@ -24,6 +28,9 @@ class BasePacket(BaseModel):
     timestamp: float = Field(default_factory=lambda: datetime.now(tz=timezone.utc).timestamp())
     trace_id: Optional[str] = None
 
+    # campos propios de subclases que forwarded() debe copiar al cable
+    _forward_extra: ClassVar[Tuple[str, ...]] = ()
+
     class Config:
         populate_by_name = True  # permite usar 'from'
         str_strip_whitespace = True
@@ -57,6 +64,31 @@ class BasePacket(BaseModel):
         """Dict apto para publicar como JSON (manteniendo alias 'from')."""
         return self.model_dump(by_alias=True)
 
+    def forwarded(self, by: str) -> Dict[str, Any]:
+        """
+        Dict de publicación para retransmitir: TTL-1 (sin bajar de 0) y 'by' agregado al trail
+        (recorte a 8). Se arma directo de los atributos, sin model_dump ni revalidar: el paquete
+        ya fue validado al parsearlo.
+        """
+        hdrs = self.headers
+        if isinstance(hdrs, dict):
+            hdrs = hdrs.get("path", [])
+        data = {
+            "proto": self.proto,
+            "type": self.type,
+            "from": self.from_,
+            "to": self.to,
+            "ttl": max(0, (self.ttl or 0) - 1),
+            "headers": ([*hdrs, by] if isinstance(hdrs, list) else [by])[-8:],
+            "payload": self.payload,
+            "msg_id": self.msg_id,
+            "timestamp": self.timestamp,
+            "trace_id": self.trace_id,
+        }
+        for name in self._forward_extra:
+            data[name] = getattr(self, name)
+        return data
+
     def with_decremented_ttl(self) -> "BasePacket":
         """Devuelve una copia con TTL-1 (sin bajar de 0)."""
         new_ttl = max(0, (self.ttl or 0) - 1)
@@ -105,6 +137,28 @@ class InfoPacket(BasePacket):
     # payload puede ser LSP o la “tabla hacia destinos” acordada.
     # Acepta dict o string JSON (de otros grupos).
     payload: Union[Dict[str, Any], str]
+    # número de secuencia del LSP (por origen, creciente) y edad en segundos;
+    # seq=None → INFO de un nodo sin secuencias (se compara por contenido)
+    seq: Optional[int] = Field(default=None, ge=0)
+    age: int = Field(default=0, ge=0, le=LSP_MAX_AGE)
+
+    _forward_extra: ClassVar[Tuple[str, ...]] = ("seq", "age")
+
+    @model_validator(mode="before")
+    @classmethod
+    def _lift_payload_seq(cls, data):
+        """Formato externo {"origin":..,"seq":9,"neighbors":{..}}: usa su 'seq' si no vino arriba."""
+        if isinstance(data, dict) and data.get("seq") is None:
+            payload = data.get("payload")
+            if isinstance(payload, dict) and isinstance(payload.get("seq"), int):
+                data = {**data, "seq": payload["seq"]}
+        return data
+
+    def forwarded(self, by: str) -> Dict[str, Any]:
+        """Como BasePacket.forwarded, envejeciendo el LSP 1 s por salto (como OSPF)."""
+        data = super().forwarded(by)
+        data["age"] = min(LSP_MAX_AGE, self.age + 1)
+        return data
 
     @field_validator("payload")
     @classmethod
@@ -139,6 +193,15 @@ class UserMessagePacket(BasePacket):
     payload: Union[str, Dict[str, Any], None] = ""
 
 
+class TransitPacket(BasePacket):
+    """
+    MESSAGE en tránsito parseado solo por cabecera: se validan los campos de ruteo
+    y el payload queda opaco (RawPayload del binario, o el objeto JSON tal cual llegó)
+    hasta que el paquete alcanza su destino.
+    """
+    type: Literal["message"]
+
+
 # Fábrica/Parser genérico
 class PacketFactory:
     @staticmethod
@@ -157,6 +220,26 @@ class PacketFactory:
         # Si no reconoce el tipo, valida como BasePacket para error claro
         return BasePacket.model_validate(obj)
 
+    @staticmethod
+    def parse_header(obj: Dict[str, Any]) -> TransitPacket:
+        """
+        Parseo solo de cabecera (type/from/to/ttl/headers/ids) para MESSAGE en tránsito.
+        No toca el payload.
+        """
+        return TransitPacket.model_validate(obj)
+
+    @staticmethod
+    def parse_lazy(obj: Dict[str, Any], my_id: str) -> BasePacket:
+        """
+        Parseo según el rol del nodo:
+          - MESSAGE que no es para mí → parse_header (payload opaco)
+          - resto (HELLO, INFO, MESSAGE para mí) → payload decodificado + parse_obj completo
+        """
+        t = (obj.get("type") or "").lower()
+        if t == "message" and str(obj.get("to") or "").strip() != my_id:
+            return PacketFactory.parse_header(obj)
+        return PacketFactory.parse_obj(materialize(obj))
+
     @staticmethod
     def ensure_trace(packet: BasePacket, node_id: str) -> BasePacket:
         """Asegura que tenga trace_id, útil al originar paquetes."""
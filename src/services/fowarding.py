@@ -1,40 +1,99 @@
 from __future__ import annotations
 import asyncio
+import contextlib
 import json
-from typing import Any, Dict, Callable, Awaitable, Optional, Iterable, Set
-
-from src.protocol.schema import PacketFactory, HelloPacket, InfoPacket, UserMessagePacket, BasePacket
-from src.storage.state import State
-from src.transport.redis_transport import RedisTransport
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Callable, Awaitable, List, Optional, Iterable, Set
+
+from src.protocol import codec as wire
+from src.protocol.schema import (
+    PacketFactory,
+    HelloPacket,
+    InfoPacket,
+    UserMessagePacket,
+    TransitPacket,
+    BasePacket,
+)
+from src.services.link_cost import LinkCostConfig, LinkCostEstimator
+from src.storage.pending import PendingQueue
+from src.storage.state import State, NEIGHBOR_DOWN, ROUTES_CHANGED
+from src.transport.base import Transport
 from src.utils.log import setup_logger
+from src.utils.ratelimit import BucketMap
+
+
+# Políticas para MESSAGE sin ruta (ForwardingConfig.no_route_policy / hold_expire_action)
+HOLD = "hold"    # retener por destino hasta que aparezca la ruta (o venza hold_sec)
+FLOOD = "flood"  # flooding controlado a vecinos
+DROP = "drop"    # descartar
+
+
+@dataclass
+class ForwardingConfig:
+    # Pipeline: lectura en lotes → decode/de-dupe/clasificación (secuencial) → workers.
+    # Cada paquete va al worker hash(from, to) % workers: se conserva el orden por (origen, destino).
+    # Colas acotadas: si los workers no dan abasto, put() bloquea la etapa de ingreso y ésta
+    # deja de leer del transporte (backpressure hasta Redis / el bus).
+    workers: int = 8
+    worker_queue_depth: int = 256
+    # Carril de control: INFO va a un worker propio (HELLO se atiende en el ingreso) y en cada
+    # lote se procesa antes que los datos; su cola no comparte backpressure con los MESSAGE.
+    control_queue_depth: int = 1024
+    read_batch: int = 64
+    read_wait_sec: float = 0.0
+    # Control de amplificación (rate <= 0 → sin límite). Solo aplica a las copias que salen
+    # por flooding: re-flood de INFO y MESSAGE sin ruta. El unicast por tabla no se limita.
+    #   - token bucket por vecino y tipo de paquete (tokens/s, ráfaga)
+    #   - presupuesto de flooding por destino sin ruta (un ID malo no inunda la malla)
+    info_rate_per_neighbor: float = 20.0
+    info_burst: float = 50.0
+    flood_rate_per_neighbor: float = 20.0
+    flood_burst: float = 50.0
+    flood_rate_per_dst: float = 1.0
+    flood_burst_per_dst: float = 5.0
+    rate_max_keys: int = 4096  # tope de buckets por mapa (destinos inventados no crecen sin límite)
+    # MESSAGE sin ruta: HOLD retiene por destino y libera en unicast apenas el snapshot de ruteo
+    # gana la ruta; si no aparece en hold_sec se aplica hold_expire_action (FLOOD o DROP).
+    # Cola acotada por destino y en total (lo que no entra se descarta).
+    no_route_policy: str = HOLD
+    hold_sec: float = 1.0
+    hold_expire_action: str = FLOOD
+    hold_max_per_dst: int = 64
+    hold_max_total: int = 4096
+    # Costos de enlace por RTT medido con el eco de timestamps de HELLO (None = costos fijos)
+    link_cost: Optional[LinkCostConfig] = None
 
 
 class ForwardingService:
     """
     Servicio de forwarding:
-      - Lee del canal propio (RedisTransport.read_loop)
+      - Lee del canal propio en lotes (Transport.read_batches) y reparte a workers (ForwardingConfig)
       - Parsea, valida y aplica reglas por tipo (hello/info/message)
       - Reenvía según TTL, headers (trail anti-ciclo), routing_table y flooding controlado
-      - Delega la actualización de LSR al callback on_info_async(payload)
+      - Delega la actualización de LSR al callback on_info_async(origin, payload, seq, age)
 
     Requiere:
-      state: State (neighbors, lsdb, routing_table, seen_cache)
-      transport: RedisTransport (publish/broadcast)
+      state: State (neighbors, lsdb, routing, seen_cache)
+      transport: Transport (Redis o loopback; publish/broadcast)
       my_id: str
       neighbor_map: dict node_id -> channel_name (para publicar a vecinos)
-      on_info_async: async fn(from_id: str, info_payload: dict) -> None
-                     (La implementa tu servicio LSR para actualizar LSDB y recálculo de rutas)
+      on_info_async: async fn(from_id: str, info_payload: dict, seq: int|None, age: int) -> bool|None
+                     (La implementa tu servicio LSR para actualizar LSDB y recálculo de rutas;
+                      False = LSP vieja/duplicada → no se retransmite)
     """
 
     def __init__(
         self,
         state: State,
-        transport: RedisTransport,
+        transport: Transport,
         my_id: str,
         neighbor_map: Dict[str, str],
-        on_info_async: Callable[[str, Dict[str, Any]], Awaitable[None]],
+        on_info_async: Callable[[str, Dict[str, Any], Optional[int], int], Awaitable[Optional[bool]]],
         hello_timeout_sec: float = 20.0,
         logger_name: Optional[str] = None,
+        cfg: Optional[ForwardingConfig] = None,
     ) -> None:
         self.state = state
         self.transport = transport
@@ -42,13 +101,36 @@ class ForwardingService:
         self.neighbor_map = dict(neighbor_map)  # id -> canal
         self.on_info_async = on_info_async
         self.hello_timeout_sec = hello_timeout_sec
+        self.cfg = cfg or ForwardingConfig()
         self.log = setup_logger(logger_name or f"FWD-{my_id}")
 
-        # tarea principal
+        # tarea principal (etapa de ingreso) y workers
         self._runner_task: Optional[asyncio.Task] = None
+        self._worker_queues: List[asyncio.Queue] = []
+        self._worker_tasks: List[asyncio.Task] = []
+        self._control_queue: Optional[asyncio.Queue] = None
         # control de apagado
         self._stopping = asyncio.Event()
 
+        # rate limiting de flooding (por vecino y tipo; por destino sin ruta)
+        c = self.cfg
+        self._neighbor_buckets: Dict[str, BucketMap] = {
+            "info": BucketMap(c.info_rate_per_neighbor, c.info_burst, c.rate_max_keys),
+            "message": BucketMap(c.flood_rate_per_neighbor, c.flood_burst, c.rate_max_keys),
+        }
+        self._dst_budget = BucketMap(c.flood_rate_per_dst, c.flood_burst_per_dst, c.rate_max_keys)
+        # descartes por motivo: invalid, duplicate, cycle, ttl, flood_budget, neighbor_rate_<tipo>,
+        # no_route, hold_overflow
+        self.drops: Counter = Counter()
+
+        # MESSAGE retenidos sin ruta (métricas: pending.held / released / expired / overflow)
+        self.pending = PendingQueue(self._on_hold_expired, c.hold_sec, c.hold_max_per_dst, c.hold_max_total)
+        self._hold_tasks: Set[asyncio.Task] = set()
+
+        # RTT por vecino → costo de enlace (State.update_link_cost)
+        self.link_costs: Optional[LinkCostEstimator] = LinkCostEstimator(c.link_cost) if c.link_cost else None
+        self._last_echo: Dict[str, float] = {}  # último ts propio ya medido, por vecino
+
     # ---------------- Lifecycle ----------------
 
     async def start(self) -> None:
@@ -58,9 +140,18 @@ class ForwardingService:
         if self._runner_task and not self._runner_task.done():
             return
         self.log.info("ForwardingService iniciado")
+        n = max(1, self.cfg.workers)
+        self._worker_queues = [asyncio.Queue(maxsize=self.cfg.worker_queue_depth) for _ in range(n)]
+        self._worker_tasks = [asyncio.create_task(self._worker(q)) for q in self._worker_queues]
+        self._control_queue = asyncio.Queue(maxsize=self.cfg.control_queue_depth)
+        self._worker_tasks.append(asyncio.create_task(self._worker(self._control_queue)))
         self._runner_task = asyncio.create_task(self._run())
 
-        # tarea periódica para purgar seen_cache y detectar vecinos caídos
+        # vecinos caídos: evento de State en el deadline exacto (no polling)
+        self.state.on_event(NEIGHBOR_DOWN, self._on_neighbor_down)
+        # tabla nueva: liberar lo retenido que ya tiene ruta
+        self.state.on_event(ROUTES_CHANGED, self._on_routes_changed)
+        # tarea periódica para purgar seen_cache
         asyncio.create_task(self._housekeeping())
 
     async def stop(self) -> None:
@@ -68,83 +159,130 @@ class ForwardingService:
         Solicita detener el servicio.
         """
         self._stopping.set()
-        if self._runner_task:
-            self._runner_task.cancel()
-            with contextlib.suppress(asyncio.CancelledError):
-                await self._runner_task
+        for task in (self._runner_task, *self._worker_tasks, *self._hold_tasks):
+            if task:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        self._worker_tasks = []
+        self.pending.clear()
 
     # ---------------- Internals ----------------
 
     async def _run(self) -> None:
         """
-        Bucle principal: consume mensajes crudos del canal propio,
-        parsea JSON → PacketFactory → maneja por tipo.
+        Etapa de ingreso: consume lotes crudos del canal propio,
+        decodifica (JSON o binario, autodetectado) → PacketFactory → de-dupe/anti-ciclo/TTL,
+        y reparte a los workers. Los MESSAGE en tránsito se parsean solo por cabecera.
+        Prioridad: en cada lote primero el control (HELLO aquí mismo, que no publica nada;
+        INFO a su worker) y después los datos, así su latencia no depende de la carga de MESSAGE.
         """
-        async for raw in self.transport.read_loop():
+        async for batch in self.transport.read_batches(self.cfg.read_batch, self.cfg.read_wait_sec):
             if self._stopping.is_set():
                 break
-
-            try:
-                data = json.loads(raw)
-            except Exception:
-                self.log.warning(f"Descartado (JSON inválido): {raw[:120]}…")
-                continue
-
+            data: List[BasePacket] = []
+            for raw in batch:
+                pkt = self._parse(raw)
+                if pkt is None or not self._admit(pkt):
+                    continue
+                if isinstance(pkt, HelloPacket):
+                    await self._on_hello(pkt)
+                elif isinstance(pkt, InfoPacket):
+                    await self._control_queue.put(pkt)
+                else:
+                    data.append(pkt)
+            for pkt in data:
+                # mismo (origen, destino) → mismo worker → mismo orden de llegada
+                q = self._worker_queues[hash((pkt.from_, pkt.to)) % len(self._worker_queues)]
+                await q.put(pkt)  # cola llena → backpressure sobre la lectura
+
+    def _parse(self, raw: Any) -> Optional[BasePacket]:
+        try:
+            data = wire.decode(raw, lazy_payload=True)
+        except Exception:
+            self.drops["invalid"] += 1
+            self.log.warning(f"Descartado (payload inválido): {raw[:120]!r}…")
+            return None
+        try:
+            return PacketFactory.parse_lazy(data, self.my_id)
+        except Exception as e:
+            self.drops["invalid"] += 1
+            self.log.warning(f"Descartado (schema inválido): {e} - raw={data}")
+            return None
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        """Worker: maneja en orden los paquetes de su cola (publish incluidos)."""
+        while True:
+            pkt = await queue.get()
             try:
-                pkt = PacketFactory.parse_obj(data)
+                await self._dispatch(pkt)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                self.log.warning(f"Descartado (schema inválido): {e} - raw={data}")
-                continue
-
-            await self._handle_packet(pkt)
+                self.log.error(f"Error manejando {pkt.type} trace={pkt.trace_id}: {e}")
+            finally:
+                queue.task_done()
 
     async def _housekeeping(self) -> None:
         """
-        Tarea periódica: purga cache de vistos, detecta vecinos caídos por falta de HELLO.
+        Tarea periódica: purga cache de vistos (solo lo vencido, desde la cabeza).
         """
         try:
             while not self._stopping.is_set():
                 await asyncio.sleep(5.0)
                 self.state.purge_seen()
-
-                # vecinos “muertos” por inactividad de HELLO
-                dead = await self.state.dead_neighbors(self.hello_timeout_sec)
-                for n in dead:
-                    self.log.warning(f"Vecino sin HELLO: {n} (posible caída)")
-                # Nota: la remoción efectiva del vecino del LSDB la haría tu LSR,
-                # ya sea aquí o en un servicio de timers (para emitir nuevo INFO).
         except asyncio.CancelledError:
             pass
 
+    async def _on_neighbor_down(self, neighbor_id: str) -> None:
+        # Conmutar ya a las alternativas precalculadas (ECMP/LFA); la remoción del enlace en la
+        # LSDB y el SPF definitivo los hace el LSR (que también re-anuncia).
+        moved = self.state.fail_over(neighbor_id)
+        if self.link_costs:
+            self.link_costs.forget(neighbor_id)
+            self._last_echo.pop(neighbor_id, None)
+        self.log.warning(f"Vecino sin HELLO: {neighbor_id} (posible caída); "
+                         f"{moved} destinos conmutados a su alternativa")
+
     # ---------------- Dispatch por tipo ----------------
 
     async def _handle_packet(self, pkt: BasePacket) -> None:
         """
         Aplica reglas comunes (de-dupe, TTL, anti-ciclo) y deriva por tipo.
         """
+        if self._admit(pkt):
+            await self._dispatch(pkt)
+
+    def _admit(self, pkt: BasePacket) -> bool:
+        """Reglas comunes, síncronas (etapa de ingreso): de-dupe, anti-ciclo, TTL."""
         # de-dupe por msg_id
         if pkt.msg_id and self.state.is_seen(pkt.msg_id):
+            self.drops["duplicate"] += 1
             self.log.debug(f"VISTO (de-dupe) {pkt.type} id={pkt.msg_id}")
-            return
+            return False
         if pkt.msg_id:
             self.state.mark_seen(pkt.msg_id)
 
         # anti-ciclo: si ya pasé por mí, lo descarto
         if pkt.seen_cycle(self.my_id):
+            self.drops["cycle"] += 1
             self.log.debug(f"CICLO detectado: {pkt.type} trace={pkt.trace_id}")
-            return
+            return False
 
         # TTL: si llega con 0, solo lo consumiría destino (MESSAGE) o control, pero no reenvía
         if pkt.ttl <= 0 and pkt.type in ("info", "message"):
+            self.drops["ttl"] += 1
             self.log.debug(f"TTL=0 descartado: {pkt.type} id={pkt.msg_id}")
-            return
+            return False
+        return True
 
+    async def _dispatch(self, pkt: BasePacket) -> None:
         # derivar a handlers específicos
         if isinstance(pkt, HelloPacket):
             await self._on_hello(pkt)
         elif isinstance(pkt, InfoPacket):
             await self._on_info(pkt)
-        elif isinstance(pkt, UserMessagePacket):
+        elif isinstance(pkt, (UserMessagePacket, TransitPacket)):
             await self._on_message(pkt)
         else:
             # Desconocido pero válido (BasePacket) → descartar
@@ -154,83 +292,195 @@ class ForwardingService:
 
     async def _on_hello(self, pkt: HelloPacket) -> None:
         """
-        HELLO: no se retransmite. Marca actividad del vecino.
+        HELLO: no se retransmite. Marca actividad del vecino y negocia el codec de cable
+        según los 'codecs' que anuncie en el payload (sin anuncio → JSON) y el carril .ctrl.
+        Con 'ts'/'echo' en el payload, mide el RTT del enlace (ver _hello_rtt).
         """
         from_node = pkt.from_
         await self.state.touch_hello(from_node)
         self.log.info(f"[HELLO] de {from_node} (trace={pkt.trace_id})")
+        if isinstance(pkt.payload, dict):
+            await self._hello_rtt(from_node, pkt.payload)
+
+        ch = self.neighbor_map.get(from_node)
+        if ch:
+            codecs = pkt.payload.get("codecs") if isinstance(pkt.payload, dict) else None
+            peer_binary = isinstance(codecs, list) and wire.BINARY in codecs
+            self.transport.set_channel_codec(ch, wire.BINARY if peer_binary else wire.JSON)
+            # carril de control dedicado del vecino (<canal>.ctrl) si lo anunció
+            peer_ctrl = isinstance(pkt.payload, dict) and pkt.payload.get("ctrl") is True
+            self.transport.set_channel_control(ch, peer_ctrl)
 
         # Opcional: si llega un HELLO de alguien que no tengo mapeado como vecino,
         # puedes decidir agregarlo dinámicamente o ignorarlo.
         # if from_node not in self.neighbor_map:
         #     self.log.info(f"HELLO de no-vecino {from_node} (ignorado en forwarding)")
 
+    async def _hello_rtt(self, from_node: str, payload: Dict[str, Any]) -> None:
+        """
+        Eco de timestamps (relojes monotónicos, cada uno solo compara contra el suyo):
+          - su 'ts' se guarda para devolvérselo en mi próximo HELLO
+          - su 'echo'[yo] = [mi ts, cuánto lo retuvo] → RTT = ahora - mi ts - retenido
+        """
+        now = time.monotonic()
+        ts = payload.get("ts")
+        if isinstance(ts, (int, float)):
+            self.state.note_peer_ts(from_node, float(ts), now)
+        if not self.link_costs:
+            return
+        echo = payload.get("echo")
+        mine = echo.get(self.my_id) if isinstance(echo, dict) else None
+        if not (isinstance(mine, list) and len(mine) == 2 and all(isinstance(x, (int, float)) for x in mine)):
+            return
+        sent, held = float(mine[0]), float(mine[1])
+        if self._last_echo.get(from_node) == sent:
+            return  # mismo eco repetido (no mandé HELLO nuevo): no es otra muestra
+        self._last_echo[from_node] = sent
+        cost = self.link_costs.sample(from_node, (now - sent - held) * 1000.0)
+        if cost is not None and await self.state.update_link_cost(from_node, cost):
+            self.log.info(f"[RTT] {from_node}: {self.link_costs.rtt_ms[from_node]:.1f} ms → costo {cost}")
+
     async def _on_info(self, pkt: InfoPacket) -> None:
         """
         INFO: actualizar LSDB vía callback y retransmitir a vecinos con TTL-- y headers++.
+        Si la LSDB la descarta por secuencia vieja/repetida, no se retransmite.
         """
         origin = pkt.from_
         # 1) Actualiza LSDB / dispara recálculo LSR
         try:
             # payload puede ser LSP o “tabla hacia destinos”, según acuerdo de tu grupo
-            await self.on_info_async(origin, pkt.payload)
+            accepted = await self.on_info_async(origin, pkt.payload, pkt.seq, pkt.age)
         except Exception as e:
             self.log.error(f"Error en on_info_async: {e}")
+            accepted = None
+        if accepted is False:
+            self.log.debug(f"[INFO] LSP de {origin} seq={pkt.seq} descartada (vieja/duplicada)")
+            return
 
         # 2) Retransmitir a vecinos (excepto al “prev hop” si podemos inferirlo)
-        pkt_out = pkt.with_decremented_ttl().with_appended_hop(self.my_id)
-        if pkt_out.ttl <= 0:
+        out = pkt.forwarded(self.my_id)
+        if out["ttl"] <= 0:
             return
 
         prev_hop: Optional[str] = pkt.headers[-1] if pkt.headers else None
-        await self._broadcast_to_neighbors(pkt_out, exclude={prev_hop} if prev_hop else set())
-        self.log.debug(f"[INFO] retransmitido trace={pkt.trace_id} ttl={pkt_out.ttl}")
+        await self._broadcast_to_neighbors(out, exclude={prev_hop} if prev_hop else set(), kind="info")
+        self.log.debug(f"[INFO] retransmitido trace={pkt.trace_id} ttl={out['ttl']}")
 
-    async def _on_message(self, pkt: UserMessagePacket) -> None:
+    async def _on_message(self, pkt: UserMessagePacket | TransitPacket) -> None:
         """
         MESSAGE:
           - Si soy destino → entregar (print/log).
-          - Si tengo next_hop → enviar unicast al canal del next_hop.
-          - Si no hay ruta → flooding controlado a vecinos (TTL--, headers++), con de-dupe.
+          - Si no → TTL--, headers++ y forward() (tabla, o según no_route_policy si no hay ruta).
         """
-        dst = pkt.to
-        if dst == self.my_id:
+        if pkt.to == self.my_id:
             self._deliver(pkt)
             return
 
-        # Intentar ruteo por tabla
-        next_hop = await self.state.get_next_hop(dst)
-        if next_hop:
-            ch = self.neighbor_map.get(next_hop)
-            if ch:
-                pkt_out = pkt.with_decremented_ttl().with_appended_hop(self.my_id)
-                if pkt_out.ttl > 0:
-                    await self.transport.publish_json(ch, pkt_out.to_publish_dict())
-                    self.log.info(f"[MSG] {pkt.from_}→{dst} via {next_hop} trace={pkt.trace_id}")
-                    return
-
-        # Fallback: flooding controlado a vecinos (evitar rebotar al prev_hop)
-        prev_hop: Optional[str] = pkt.headers[-1] if pkt.headers else None
-        pkt_out = pkt.with_decremented_ttl().with_appended_hop(self.my_id)
-        if pkt_out.ttl <= 0:
+        # Un solo paso: TTL-- y headers++ directo al dict de publicación
+        out = pkt.forwarded(self.my_id)
+        if out["ttl"] <= 0:
+            self.drops["ttl"] += 1
             self.log.debug(f"[MSG] TTL agotado, descartar trace={pkt.trace_id}")
             return
+        await self.forward(out, prev_hop=pkt.headers[-1] if pkt.headers else None)
+
+    async def forward(self, out: Dict[str, Any], prev_hop: Optional[str] = None, hold: bool = True) -> None:
+        """
+        Envía un MESSAGE ya preparado (dict de publicación) hacia out["to"]:
+          - con ruta → unicast al next_hop (ECMP: hash estable de (from, to, trace_id), así todo
+            el flujo va por el mismo camino y flujos distintos se reparten)
+          - sin ruta → según cfg.no_route_policy: retener hasta que aparezca la ruta (hold),
+            flooding controlado (flood) o descartar (drop)
+        También lo usa Node.send_message para los paquetes que origina el nodo.
+        """
+        dst = out["to"]
+        next_hop = self.state.next_hop(dst, flow=(out.get("from"), dst, out.get("trace_id")))
+        ch = self.neighbor_map.get(next_hop) if next_hop else None
+        if ch:
+            if dst in self.pending:
+                # hay retenidos de este destino: salen antes, para no reordenar el flujo
+                await self._release(dst)
+            await self.transport.publish_json(ch, out)
+            self.log.info(f"[MSG] {out.get('from')}→{dst} via {next_hop} trace={out.get('trace_id')}")
+            return
+
+        policy = self.cfg.no_route_policy
+        if policy == HOLD and hold:
+            if self.pending.hold(dst, (out, prev_hop)):
+                self.log.debug(f"[MSG-HOLD] {out.get('from')}→{dst} retenido (sin ruta) trace={out.get('trace_id')}")
+            else:
+                self.drops["hold_overflow"] += 1
+                self.log.debug(f"[MSG-HOLD] cola llena para {dst}, descartar trace={out.get('trace_id')}")
+            return
+        if policy == DROP or (policy == HOLD and self.cfg.hold_expire_action == DROP):
+            self.drops["no_route"] += 1
+            self.log.debug(f"[MSG] sin ruta a {dst}, descartar trace={out.get('trace_id')}")
+            return
+        await self._flood(out, prev_hop)
+
+    async def _flood(self, out: Dict[str, Any], prev_hop: Optional[str]) -> None:
+        """Flooding controlado a vecinos (evitando rebotar al prev_hop), con presupuesto por destino."""
+        dst = out["to"]
+        # presupuesto por destino: un destino inexistente no puede inundar la red a tasa libre
+        if not self._dst_budget.take(dst):
+            self.drops["flood_budget"] += 1
+            self.log.debug(f"[MSG-FLOOD] presupuesto agotado para {dst}, descartar trace={out.get('trace_id')}")
+            return
 
-        await self._broadcast_to_neighbors(pkt_out, exclude={prev_hop} if prev_hop else set())
-        self.log.info(f"[MSG-FLOOD] {pkt.from_}→{dst} (sin ruta) trace={pkt.trace_id}")
+        await self._broadcast_to_neighbors(out, exclude={prev_hop} if prev_hop else set(), kind="message")
+        self.log.info(f"[MSG-FLOOD] {out.get('from')}→{dst} (sin ruta) trace={out.get('trace_id')}")
+
+    # ---------------- Retención sin ruta (hold-and-release) ----------------
+
+    async def _release(self, dst: str) -> None:
+        """Hay ruta hacia 'dst': sale todo lo retenido, en orden de llegada."""
+        items = self.pending.release(dst)
+        if items:
+            self.log.info(f"[MSG-HOLD] ruta a {dst}: liberando {len(items)} paquete(s)")
+        for out, prev_hop in items:
+            await self.forward(out, prev_hop)
+
+    async def _on_routes_changed(self, _version: str) -> None:
+        for dst in self.pending.destinations():
+            if self.state.next_hop(dst):
+                await self._release(dst)
+
+    def _on_hold_expired(self, dst: str) -> None:
+        # callback síncrono del scheduler de la cola: el envío va en una tarea
+        task = asyncio.create_task(self._expire_held(dst))
+        self._hold_tasks.add(task)
+        task.add_done_callback(self._hold_tasks.discard)
+
+    async def _expire_held(self, dst: str) -> None:
+        """Venció la espera sin ruta: fallback (hold_expire_action), o unicast si justo apareció."""
+        items = self.pending.expire(dst)
+        self.log.info(f"[MSG-HOLD] sin ruta a {dst} tras {self.cfg.hold_sec}s: {len(items)} paquete(s) a fallback")
+        for out, prev_hop in items:
+            await self.forward(out, prev_hop, hold=False)
 
     # ---------------- Helpers ----------------
 
-    async def _broadcast_to_neighbors(self, pkt: BasePacket, exclude: Set[str] = set()) -> None:
+    async def _broadcast_to_neighbors(self, data: Dict[str, Any], exclude: Set[str] = set(),
+                                      kind: Optional[str] = None) -> None:
         """
-        Envía un paquete a todos los vecinos directos, excluyendo algunos IDs (p.ej., prev_hop).
+        Envía un paquete (dict de publicación) a todos los vecinos directos,
+        excluyendo algunos IDs (p.ej., prev_hop).
+        Con 'kind' ("info" | "message") cada copia consume un token del bucket de ese
+        vecino y tipo; los vecinos sin tokens se saltan (y se cuenta el descarte).
         """
         # Solo a vecinos conocidos en neighbor_map
         targets = [nid for nid in self.neighbor_map.keys() if nid not in exclude and nid != self.my_id]
+        buckets = self._neighbor_buckets.get(kind) if kind else None
+        if buckets is not None and buckets.enabled:
+            allowed = [nid for nid in targets if buckets.take(nid)]
+            if len(allowed) < len(targets):
+                self.drops[f"neighbor_rate_{kind}"] += len(targets) - len(allowed)
+                self.log.debug(f"[RATE] {kind}: {len(targets) - len(allowed)} copias descartadas")
+            targets = allowed
         channels = [self.neighbor_map[nid] for nid in targets]
         if not channels:
             return
-        await self.transport.broadcast(channels, pkt.to_publish_dict())
+        await self.transport.broadcast(channels, data)
 
     def _deliver(self, pkt: UserMessagePacket) -> None:
         """
@@ -0,0 +1,64 @@
+from __future__ import annotations
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class LinkCostConfig:
+    # RTT por vecino (eco de timestamps en HELLO) → EWMA → costo cuantizado con histéresis.
+    # costo = base_cost + floor(rtt_ewma / ms_per_unit), tope max_cost.
+    alpha: float = 0.25          # peso de la muestra nueva en el EWMA
+    base_cost: float = 1.0       # costo de un enlace "rápido" (el mismo que el estático de antes)
+    ms_per_unit: float = 10.0    # cada tanto RTT suma 1 al costo
+    max_cost: float = 64.0
+    # el nivel solo cambia si el EWMA sale del escalón actual por más de esta fracción de
+    # escalón: el jitter alrededor de un borde no hace flapear rutas ni dispara INFO
+    hysteresis: float = 0.5
+    min_samples: int = 3         # muestras antes de publicar el primer costo medido
+
+
+class LinkCostEstimator:
+    """
+    Estima el costo de cada enlace a partir de muestras de RTT (ms).
+    sample() devuelve el costo nuevo solo cuando cambia el nivel cuantizado (si no, None).
+    """
+
+    def __init__(self, cfg: Optional[LinkCostConfig] = None) -> None:
+        self.cfg = cfg or LinkCostConfig()
+        self.rtt_ms: Dict[str, float] = {}   # EWMA por vecino
+        self._samples: Dict[str, int] = {}
+        self._level: Dict[str, int] = {}     # escalón publicado por vecino
+
+    def sample(self, neighbor: str, rtt_ms: float) -> Optional[float]:
+        c = self.cfg
+        if rtt_ms < 0 or not math.isfinite(rtt_ms):
+            return None
+        prev = self.rtt_ms.get(neighbor)
+        ewma = rtt_ms if prev is None else prev + c.alpha * (rtt_ms - prev)
+        self.rtt_ms[neighbor] = ewma
+        n = self._samples[neighbor] = self._samples.get(neighbor, 0) + 1
+        if n < c.min_samples:
+            return None
+
+        x = ewma / c.ms_per_unit           # posición continua en escalones
+        level = self._level.get(neighbor)
+        if level is not None and level - c.hysteresis <= x < level + 1 + c.hysteresis:
+            return None                    # dentro del escalón actual (+ margen)
+        new_level = int(x)
+        if new_level == level:
+            return None
+        self._level[neighbor] = new_level
+        return self.cost(neighbor)
+
+    def cost(self, neighbor: str) -> Optional[float]:
+        level = self._level.get(neighbor)
+        if level is None:
+            return None
+        return min(self.cfg.max_cost, self.cfg.base_cost + level)
+
+    def forget(self, neighbor: str) -> None:
+        """Vecino caído: al volver se mide de cero."""
+        self.rtt_ms.pop(neighbor, None)
+        self._samples.pop(neighbor, None)
+        self._level.pop(neighbor, None)
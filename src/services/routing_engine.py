@@ -0,0 +1,410 @@
+from __future__ import annotations
+import heapq
+import math
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+# {u: {v: w}}: un dict de dicts o cualquier Mapping equivalente (p. ej. storage.adjacency.GraphView)
+Graph = Mapping[str, Mapping[str, float]]
+
+
+class Route(NamedTuple):
+    next_hop: str
+    cost: float
+    path: List[str]  # [src, ..., dst]
+
+
+@dataclass
+class SPFResult:
+    """
+    Resultado de un SPF desde 'src':
+      - dist: costo mínimo por nodo alcanzable (src incluido con 0.0)
+      - next_hop: primer salto por destino (src excluido); entre empates, el de id menor
+      - next_hops: todos los primeros saltos de igual costo (ECMP), tupla ordenada
+      - prev: predecesor en el árbol de caminos mínimos (para reconstruir rutas)
+      - alternates: next hop alternativo libre de lazos (LFA) por destino, si se calculó
+    """
+    src: str
+    dist: Dict[str, float] = field(default_factory=dict)
+    next_hop: Dict[str, str] = field(default_factory=dict)
+    next_hops: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    prev: Dict[str, str] = field(default_factory=dict)
+    alternates: Dict[str, str] = field(default_factory=dict)
+
+    def cost(self, dst: str) -> float:
+        return self.dist.get(dst, math.inf)
+
+    def path(self, dst: str) -> List[str]:
+        """Camino [src, ..., dst]; lista vacía si dst es inalcanzable."""
+        if dst == self.src:
+            return [dst]
+        if dst not in self.prev:
+            return []
+        out = [dst]
+        while out[-1] != self.src:
+            out.append(self.prev[out[-1]])
+        out.reverse()
+        return out
+
+    def routes(self) -> Dict[str, Route]:
+        """{dst: Route(next_hop, cost, path)} para todos los destinos alcanzables."""
+        return {dst: Route(nh, self.dist[dst], self.path(dst)) for dst, nh in self.next_hop.items()}
+
+
+def _merge_hops(a: Tuple[str, ...], b: Tuple[str, ...]) -> Tuple[str, ...]:
+    if all(h in a for h in b):
+        return a
+    return tuple(sorted(set(a) | set(b)))
+
+
+def shortest_paths(graph: Graph, src: str) -> SPFResult:
+    """
+    Dijkstra con heap binario (O(E log V)) desde 'src'.
+    graph: {u: {v: w, ...}, ...} con w > 0.
+    El next_hop se hereda durante la relajación (sin recorrer prev[] por destino).
+    Empates de costo: next_hop se queda con el de id menor (determinista) y next_hops
+    acumula la unión de los primeros saltos de todos los predecesores de igual costo.
+    """
+    res = SPFResult(src=src)
+    dist = res.dist
+    next_hop = res.next_hop
+    next_hops = res.next_hops
+    prev = res.prev
+
+    dist[src] = 0.0
+    done = set()
+    heap = [(0.0, src)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in done:
+            continue  # entrada vieja del heap (borrado perezoso)
+        done.add(u)
+        nh_u = next_hop.get(u)
+        nhs_u = next_hops.get(u)
+        for v, w in graph.get(u, {}).items():
+            if v in done:
+                continue
+            alt = d + float(w)
+            cand = v if u == src else nh_u
+            cur = dist.get(v, math.inf)
+            if alt < cur:
+                dist[v] = alt
+                next_hop[v] = cand
+                next_hops[v] = (v,) if u == src else nhs_u
+                prev[v] = u
+                heapq.heappush(heap, (alt, v))
+            elif alt == cur:
+                # u ya es definitivo, así que su conjunto no cambia más
+                next_hops[v] = _merge_hops(next_hops[v], (v,) if u == src else nhs_u)
+                if cand < next_hop[v]:
+                    next_hop[v] = cand
+                    prev[v] = u
+    return res
+
+
+# Snapshot compacto del grafo (CSR) para mandarlo a otro proceso:
+#   (nombres, offsets, destinos, pesos) con destinos[offsets[i]:offsets[i+1]] = vecinos de nombres[i]
+GraphSnapshot = Tuple[List[str], array, array, array]
+
+
+def pack_graph(graph: Graph) -> GraphSnapshot:
+    names = list(graph)
+    seen = set(names)
+    for edges in graph.values():
+        for v in edges:
+            if v not in seen:  # destino sin adyacencia propia
+                seen.add(v)
+                names.append(v)
+    index = {n: i for i, n in enumerate(names)}
+    offsets = array("i", [0])
+    targets = array("i")
+    weights = array("d")
+    for n in names:
+        for v, w in graph.get(n, {}).items():
+            targets.append(index[v])
+            weights.append(float(w))
+        offsets.append(len(targets))
+    return names, offsets, targets, weights
+
+
+def unpack_graph(snapshot: GraphSnapshot) -> Graph:
+    names, offsets, targets, weights = snapshot
+    return {
+        n: {names[targets[k]]: weights[k] for k in range(offsets[i], offsets[i + 1])}
+        for i, n in enumerate(names)
+    }
+
+
+def loop_free_alternates(graph: Graph, res: SPFResult) -> Dict[str, str]:
+    """
+    Loop-free alternates (RFC 5286) desde res.src, con un SPF más por vecino.
+    Un vecino N (que no es el next hop primario P) sirve de alternativa para D si
+        dist(N, D) < dist(N, S) + dist(S, D)      (no devuelve el tráfico a S)
+    Entre los candidatos se prefiere el que protege también el nodo P
+        dist(N, D) < dist(N, P) + dist(P, D)
+    y después el de menor costo total (desempate por id).
+    Destinos con ECMP no llevan LFA: la alternativa es otro miembro del conjunto.
+    """
+    src = res.src
+    nbrs = {n: float(w) for n, w in graph.get(src, {}).items()}
+    if len(nbrs) < 2:
+        return {}
+    dist_from = {n: shortest_paths(graph, n).dist for n in nbrs}
+    out: Dict[str, str] = {}
+    for dst, primary in res.next_hops.items():
+        if len(primary) != 1:
+            continue
+        p = primary[0]
+        d_sd = res.dist[dst]
+        best: Optional[Tuple[bool, float, str]] = None
+        for n, w in nbrs.items():
+            if n == p:
+                continue
+            dn = dist_from[n]
+            d_nd = dn.get(dst)
+            if d_nd is None or not d_nd < dn.get(src, math.inf) + d_sd:
+                continue
+            node_protecting = dst != p and d_nd < dn.get(p, math.inf) + dist_from[p].get(dst, math.inf)
+            key = (not node_protecting, w + d_nd, n)
+            if best is None or key < best:
+                best = key
+        if best is not None:
+            out[dst] = best[2]
+    return out
+
+
+def spf_job(snapshot: GraphSnapshot, src: str, lfa: bool = False) -> SPFResult:
+    """Punto de entrada para un ProcessPoolExecutor: SPF completo (y LFA) sobre un snapshot."""
+    graph = unpack_graph(snapshot)
+    res = shortest_paths(graph, src)
+    if lfa:
+        res.alternates = loop_free_alternates(graph, res)
+    return res
+
+
+class IncrementalSPF:
+    """
+    Árbol de caminos mínimos desde 'src' mantenido entre recálculos (SPF incremental,
+    estilo Ramalingam–Reps / iSPF de OSPF).
+
+    update(graph) compara la adyacencia nueva con la anterior nodo por nodo y solo
+    re-evalúa lo afectado:
+      - arista del árbol que empeora/desaparece → se invalida el subárbol que cuelga de ella
+        y se re-siembra desde sus vecinos de entrada no afectados;
+      - arista que mejora/aparece → se relaja su destino;
+      - un Dijkstra acotado propaga solo desde esos nodos.
+    Cada nodo tiene etiqueta (costo, next_hop) comparada lexicográficamente, igual que el
+    desempate de shortest_paths(), así que el resultado coincide con un SPF completo.
+    Los conjuntos ECMP (next_hops) se recalculan después, solo para los nodos tocados y los
+    que cuelgan de ellos, en orden de distancia.
+    Si cambia más de 'full_ratio' de los nodos, se recalcula completo.
+    """
+
+    def __init__(self, src: str, full_ratio: float = 0.25) -> None:
+        self.src = src
+        self.full_ratio = full_ratio
+        self.graph: Graph = {}
+        self.rev: Graph = {}                        # v -> {u: w} (aristas de entrada)
+        self.children: Dict[str, Set[str]] = {}     # hijos en el árbol (según prev)
+        self.result = SPFResult(src=src)
+        self.full_runs = 0
+        self.incremental_runs = 0
+        self.tree_version = 0   # sube cuando cambia alguna etiqueta o conjunto ECMP del árbol
+
+    # ------------- API -------------
+
+    def update(self, graph: Graph, touched: Optional[Iterable[str]] = None) -> Set[str]:
+        """
+        Integra el grafo nuevo y devuelve los destinos cuyo conjunto de next hops cambió
+        (incluye los que aparecen o quedan inalcanzables).
+        touched: nodos cuya adyacencia pudo cambiar desde la última llamada (si el llamador
+        lo sabe); solo esos se comparan. None = comparar todos.
+        """
+        if not self.full_runs:
+            return self._full(graph)
+        candidates = set(self.graph) | set(graph) if touched is None else touched
+        changed_nodes = [u for u in candidates
+                         if self.graph.get(u, {}) != dict(graph.get(u, {}).items())]
+        if not changed_nodes:
+            return set()
+        if len(changed_nodes) > self.full_ratio * max(1, len(graph)):
+            return self._full(graph)
+
+        worse: List[Tuple[str, str]] = []
+        better: List[Tuple[str, str]] = []
+        ends: Set[str] = set()
+        for u in changed_nodes:
+            old = self.graph.get(u, {})
+            new = graph.get(u, {})
+            for v in set(old) | set(new):
+                ow, nw = old.get(v), new.get(v)
+                if ow == nw:
+                    continue
+                self._set_edge(u, v, None if nw is None else float(nw))
+                ends.add(v)
+                if nw is None or (ow is not None and float(nw) > float(ow)):
+                    worse.append((u, v))
+                else:
+                    better.append((u, v))
+        self.incremental_runs += 1
+        relabeled = self._repair(worse, better)
+        changed = self._refresh_hops(relabeled | ends)
+        if relabeled or changed:
+            self.tree_version += 1
+        return changed
+
+    # ------------- internals -------------
+
+    def load(self, graph: Graph, result: SPFResult) -> Set[str]:
+        """
+        Reemplaza el árbol por un SPF completo ya calculado (p. ej. en otro proceso)
+        para 'graph'. Devuelve los destinos cuyo conjunto de next hops cambió.
+        """
+        old = self.result
+        before = dict(old.next_hops)
+        self.graph = {u: {v: float(w) for v, w in edges.items()} for u, edges in graph.items()}
+        self.rev = {}
+        for u, edges in self.graph.items():
+            for v, w in edges.items():
+                self.rev.setdefault(v, {})[u] = w
+        self.result = result
+        self.children = {}
+        for v, u in self.result.prev.items():
+            self.children.setdefault(u, set()).add(v)
+        self.full_runs += 1
+        after = self.result.next_hops
+        if after != before or result.dist != old.dist or result.next_hop != old.next_hop:
+            self.tree_version += 1
+        return {d for d in set(before) | set(after) if before.get(d) != after.get(d)}
+
+    def _full(self, graph: Graph) -> Set[str]:
+        return self.load(graph, shortest_paths(graph, self.src))
+
+    def _set_edge(self, u: str, v: str, w: Optional[float]) -> None:
+        if w is None:
+            self.graph.get(u, {}).pop(v, None)
+            self.rev.get(v, {}).pop(u, None)
+        else:
+            self.graph.setdefault(u, {})[v] = w
+            self.rev.setdefault(v, {})[u] = w
+
+    def _label(self, v: str) -> Tuple[float, str]:
+        if v == self.src:
+            return (0.0, "")
+        d = self.result.dist.get(v)
+        return (math.inf, "") if d is None else (d, self.result.next_hop[v])
+
+    def _candidate(self, u: str, v: str, w: float) -> Tuple[float, str]:
+        return (self.result.dist[u] + w, v if u == self.src else self.result.next_hop[u])
+
+    def _set_parent(self, v: str, u: Optional[str]) -> None:
+        old = self.result.prev.get(v)
+        if old is not None:
+            self.children.get(old, set()).discard(v)
+        if u is None:
+            self.result.prev.pop(v, None)
+        else:
+            self.result.prev[v] = u
+            self.children.setdefault(u, set()).add(v)
+
+    def _repair(self, worse: List[Tuple[str, str]], better: List[Tuple[str, str]]) -> Set[str]:
+        """Corrige dist/next_hop/prev; devuelve los nodos cuya etiqueta se tocó."""
+        res = self.result
+        before: Dict[str, Optional[str]] = {}
+
+        # 1) subárboles colgando de aristas del árbol que empeoraron
+        affected: Set[str] = set()
+        stack = [v for u, v in worse if res.prev.get(v) == u and v not in affected]
+        while stack:
+            v = stack.pop()
+            if v in affected:
+                continue
+            affected.add(v)
+            stack.extend(self.children.get(v, ()))
+        for v in affected:
+            before[v] = res.next_hop.get(v)
+            res.dist.pop(v, None)
+            res.next_hop.pop(v, None)
+            self._set_parent(v, None)
+
+        heap: List[Tuple[float, str, str]] = []
+
+        def relax(u: str, v: str, w: float) -> None:
+            if v == self.src or u not in res.dist:
+                return
+            cand = self._candidate(u, v, w)
+            if cand < self._label(v):
+                before.setdefault(v, res.next_hop.get(v))
+                res.dist[v], res.next_hop[v] = cand
+                self._set_parent(v, u)
+                heapq.heappush(heap, (cand[0], cand[1], v))
+
+        # 2) re-sembrar afectados desde vecinos de entrada que conservan etiqueta
+        for v in affected:
+            for u, w in self.rev.get(v, {}).items():
+                if u not in affected:
+                    relax(u, v, w)
+        # 3) aristas que mejoraron
+        for u, v in better:
+            relax(u, v, self.graph[u][v])
+
+        # 4) Dijkstra acotado desde lo que cambió
+        while heap:
+            d, nh, u = heapq.heappop(heap)
+            if (d, nh) != self._label(u):
+                continue  # entrada vieja
+            for v, w in self.graph.get(u, {}).items():
+                relax(u, v, w)
+
+        return set(before)
+
+    def _hops_of(self, v: str) -> Tuple[str, ...]:
+        """Primeros saltos de igual costo de 'v', a partir de sus predecesores en el DAG."""
+        res = self.result
+        d = res.dist.get(v)
+        if d is None:
+            return ()
+        hops: Set[str] = set()
+        for u, w in self.rev.get(v, {}).items():
+            du = res.dist.get(u)
+            if du is not None and du + w == d:
+                hops.update((v,) if u == self.src else res.next_hops.get(u, ()))
+        return tuple(sorted(hops))
+
+    def _refresh_hops(self, seeds: Set[str]) -> Set[str]:
+        """
+        Recalcula next_hops desde 'seeds' (etiqueta o aristas de entrada cambiadas) hacia
+        abajo. En orden de distancia: cada nodo se evalúa con sus predecesores ya al día.
+        Los sucesores de las semillas entran también: si la distancia de una semilla cambió,
+        cambia el DAG de sus vecinos aunque conserven distancia (un ex-hijo puede pasar a
+        ser predecesor y tiene que evaluarse antes que ella).
+        Devuelve los nodos cuyo conjunto cambió.
+        """
+        res = self.result
+        changed: Set[str] = set()
+        queued: Set[str] = set()
+        heap: List[Tuple[float, str]] = []
+
+        def push(v: str) -> None:
+            if v != self.src and v not in queued:
+                queued.add(v)
+                heapq.heappush(heap, (res.dist.get(v, math.inf), v))
+
+        for v in seeds:
+            push(v)
+            for x in self.graph.get(v, {}):
+                push(x)
+        while heap:
+            _, v = heapq.heappop(heap)
+            old = res.next_hops.get(v)
+            new = self._hops_of(v)
+            if new:
+                res.next_hops[v] = new
+            else:
+                res.next_hops.pop(v, None)
+            if new != (old or ()):
+                changed.add(v)
+                for x in self.graph.get(v, {}):
+                    push(x)
+        return changed
@@ -1,124 +1,65 @@
 from __future__ import annotations
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, Tuple, Optional, List
 from dataclasses import dataclass, field
 import time
 
-from src.storage.state import State
-from src.transport.redis_transport import RedisTransport
+from src.storage.state import (
+    State,
+    LSP_NEW,
+    LSP_STALE,
+    LSP_WITHDRAWN,
+    NEIGHBOR_DOWN,
+    NEIGHBOR_UP,
+    LSP_EXPIRED,
+    LINK_COST_CHANGED,
+)
+from src.protocol.schema import LSP_MAX_AGE
+from src.transport.base import Transport
 from src.protocol.builders import build_info
+from src.services.routing_engine import (
+    IncrementalSPF,
+    loop_free_alternates,
+    pack_graph,
+    spf_job,
+    unpack_graph,
+)
 from src.utils.log import setup_logger
 
 
-def _dijkstra_next_hops(
-    graph: Dict[str, Dict[str, float]],
-    src: str
-) -> Dict[str, str]:
-    """
-    Dijkstra que devuelve únicamente el 'next_hop' por destino, no la ruta completa.
-    graph: {u: {v: w, ...}, ...}
-    Retorna: {dst: next_hop}
-    """
-    import math
-    dist: Dict[str, float] = {n: math.inf for n in graph.keys()}
-    prev: Dict[str, Optional[str]] = {n: None for n in graph.keys()}
-    visited: Dict[str, bool] = {n: False for n in graph.keys()}
-
-    dist[src] = 0.0
-
-    # cola simple O(V^2) suficiente para el lab
-    for _ in range(len(graph)):
-        # elegir el no visitado con menor distancia
-        u = None
-        best = math.inf
-        for n in graph.keys():
-            if not visited[n] and dist[n] < best:
-                u = n
-                best = dist[n]
-        if u is None:
-            break
-        visited[u] = True
-
-        # relajar vecinos
-        for v, w in graph[u].items():
-            if visited.get(v):
-                continue
-            alt = dist[u] + float(w)
-            if alt < dist[v]:
-                dist[v] = alt
-                prev[v] = u
-
-    # reconstruir next_hop: para cada dst, seguir prev[] hacia atrás
-    next_hop: Dict[str, str] = {}
-    for dst in graph.keys():
-        if dst == src:
-            continue
-        # reconstruir primer salto
-        # sube desde dst hasta src, guardando el penúltimo
-        cur = dst
-        if prev[cur] is None:
-            continue  # inalcanzable
-        while prev[cur] is not None and prev[cur] != src:
-            cur = prev[cur]
-        if prev[cur] == src:
-            next_hop[dst] = cur
-    return next_hop
-
-
-def _dijkstra_table_and_costs(graph: Dict[str, Dict[str, float]], src: str) -> tuple[Dict[str, str], Dict[str, float]]:
-    import math
-    dist = {n: math.inf for n in graph}
-    prev = {n: None for n in graph}
-    visited = {n: False for n in graph}
-    dist[src] = 0.0
-
-    for _ in range(len(graph)):
-        u, best = None, math.inf
-        for n in graph:
-            if not visited[n] and dist[n] < best:
-                u, best = n, dist[n]
-        if u is None:
-            break
-        visited[u] = True
-        for v, w in graph[u].items():
-            if visited[v]:
-                continue
-            alt = dist[u] + float(w)
-            if alt < dist[v]:
-                dist[v] = alt
-                prev[v] = u
-
-    next_hop = {}
-    for dst in graph:
-        if dst == src or dist[dst] == math.inf:
-            continue
-        cur = dst
-        while prev[cur] is not None and prev[cur] != src:
-            cur = prev[cur]
-        if prev[cur] == src:
-            next_hop[dst] = cur
-    return next_hop, dist
-
-
-
 @dataclass
 class LSRConfig:
     hello_timeout_sec: float = 20.0
     info_interval_sec: float = 12.0
-    on_change_debounce_sec: float = 0.4   # retrasa un poco para acumular cambios
+    # Throttling de SPF (estilo OSPF): primer SPF tras spf_initial_delay_sec; mientras sigan
+    # llegando cambios, el hold entre corridas se duplica desde spf_hold_sec hasta spf_max_hold_sec.
+    # Un cambio nunca espera más de max(spf_initial_delay_sec, spf_max_hold_sec) para su SPF.
+    spf_initial_delay_sec: float = 0.4
+    spf_hold_sec: float = 1.0
+    spf_max_hold_sec: float = 5.0
     advertise_links_from_neighbors_table: bool = True
     """
     Si True: el INFO anuncia mis enlaces directos (LSP clásico) usando State.neighbors.
     Si False: el INFO anunciará una 'tabla hacia destinos' si ya la tienes (no recomendado
     para LSR puro, pero lo dejo por compatibilidad con el acuerdo de tu grupo).
     """
+    # SPF en un ProcessPoolExecutor para LSDB grandes (el loop de forwarding no se frena);
+    # por debajo de spf_offload_min_nodes se calcula inline (incremental)
+    spf_executor: bool = False
+    spf_offload_min_nodes: int = 500
+    spf_workers: int = 1
+    # Loop-free alternates (RFC 5286) precalculados: al caer un vecino, State.fail_over()
+    # conmuta a ellos sin esperar el recálculo. Cuestan un SPF extra por vecino, así que solo
+    # se recalculan cuando cambia mi árbol o mis enlaces (o dentro del job remoto)
+    lfa: bool = True
 
 
 class RoutingLSRService:
     """
     Servicio de routing LSR:
-      - Mantiene LSDB y recalcula rutas (Dijkstra)
-      - Emite INFO periódicamente y on-change
+      - Mantiene LSDB y recalcula rutas (SPF incremental sobre el árbol previo)
+      - Emite INFO periódicamente (refresh) y on-change, con número de secuencia por LSP
       - Detecta vecinos caídos por timeout de HELLO y anuncia cambios
 
     Interfaz pública:
@@ -128,7 +69,7 @@ class RoutingLSRService:
 
     Dependencias:
       - state: State
-      - transport: RedisTransport
+      - transport: Transport (Redis o loopback)
       - my_id: str
       - neighbor_map: {node_id: channel_name}
     """
@@ -136,7 +77,7 @@ class RoutingLSRService:
     def __init__(
         self,
         state: State,
-        transport: RedisTransport,
+        transport: Transport,
         my_id: str,
         neighbor_map: Dict[str, str],
         cfg: Optional[LSRConfig] = None,
@@ -151,147 +92,296 @@ class RoutingLSRService:
 
         # control
         self._stopping = asyncio.Event()
-        self._loop_task: Optional[asyncio.Task] = None
         self._ticker_task: Optional[asyncio.Task] = None
-        self._debounce_task: Optional[asyncio.Task] = None
+        self._spf_task: Optional[asyncio.Task] = None   # corrida de SPF agendada (a lo sumo una)
+        self._spf_pending: bool = False  # llegaron cambios con la corrida ya en marcha
 
         # versión local de cambios (para evitar anuncios vacíos)
         self._last_advertised_view: Dict[str, float] = {}
         self._last_recalc_ts: float = 0.0
+        # secuencia de mis LSP (basada en reloj para que un reinicio no retroceda)
+        self._seq: int = 0
+        # árbol de caminos mínimos mantenido entre recálculos
+        self._spf = IncrementalSPF(my_id)
+        self.last_changed_destinations: set[str] = set()
+        # versión de la última tabla que publicó el SPF (fail_over() publica otras en el medio)
+        self._routing_version: int = 0
+        self._published_tree: int = -1  # tree_version del SPF en la última tabla publicada
+        self._spf_pool: Optional[ProcessPoolExecutor] = None
+        self._spf_gen: int = 0  # descarta resultados de SPF remotos ya superados
+        # nodos tocados en la LSDB aún no integrados al árbol (None = comparar todo)
+        self._touched: Optional[set[str]] = set()
+        # árbol y enlaces propios con los que se calcularon las LFA vigentes
+        self._lfa_key: Optional[Tuple[int, Dict[str, float]]] = None
+        self._lfa: Dict[str, str] = {}
+
+        # throttling de SPF
+        self._spf_hold: float = self.cfg.spf_hold_sec
+        self._last_spf_run: Optional[float] = None
+        self.spf_scheduled: int = 0   # cambios que pidieron SPF
+        self.spf_executed: int = 0    # corridas efectivas
 
     # ------------- Lifecycle -------------
 
     async def start(self) -> None:
-        if self._loop_task and not self._loop_task.done():
+        if self._ticker_task and not self._ticker_task.done():
             return
         self.log.info("RoutingLSRService iniciado")
 
         # Ticker INFO periódico
         self._ticker_task = asyncio.create_task(self._periodic_info())
 
-        # Loop de vigilancia de vecinos caídos (por HELLO timeout) + recálculo
-        self._loop_task = asyncio.create_task(self._watchdog())
+        # Vencimientos exactos (sin polling): vecino sin HELLO y LSP sin refresh.
+        # Regla: una LSP expira si no recibimos INFO en ~3 periodos
+        self.state.enable_liveness(self.cfg.hello_timeout_sec, 3 * self.cfg.info_interval_sec)
+        self.state.on_event(NEIGHBOR_DOWN, self._on_neighbor_down)
+        self.state.on_event(NEIGHBOR_UP, self._on_neighbor_up)
+        self.state.on_event(LSP_EXPIRED, self._on_lsp_expired)
+        # costo de enlace medido (RTT): recálculo + re-anuncio, con el mismo throttling de SPF
+        self.state.on_event(LINK_COST_CHANGED, self._on_link_cost_changed)
+
+    async def withdraw(self) -> None:
+        """
+        Apagado ordenado: flood de una LSP de retiro (sin enlaces, seq nueva, edad máxima).
+        Los demás me sacan de la LSDB al recibirla (y mis vecinos me dan de baja) en vez de
+        esperar hello_timeout + el vencimiento de mi LSP. La seq es la siguiente normal, no una
+        "máxima": así al reiniciar mis LSP nuevas siguen siendo más nuevas que el retiro.
+        """
+        pkt = build_info(self.my_id, {}, seq=self.next_seq(), age=LSP_MAX_AGE)
+        channels = [self.neighbor_map[nid] for nid in self.neighbor_map.keys() if nid != self.my_id]
+        if channels:
+            await self.transport.broadcast(channels, pkt.to_publish_dict())
+            self.log.info("[LSR-INFO] LSP de retiro enviada")
+        self._last_advertised_view = {}
 
     async def stop(self) -> None:
         self._stopping.set()
-        for task in (self._ticker_task, self._loop_task, self._debounce_task):
+        self.state.disable_liveness()
+        for task in (self._ticker_task, self._spf_task):
             if task:
                 task.cancel()
                 try:
                     await task
                 except asyncio.CancelledError:
                     pass
+        if self._spf_pool:
+            self._spf_pool.shutdown(wait=False, cancel_futures=True)
+            self._spf_pool = None
 
     # ------------- Integración con Forwarding -------------
 
-    async def on_info(self, origin: str, view: Dict[str, float]) -> None:
+    async def on_info(self,
+                      origin: str,
+                      view: Dict[str, float],
+                      seq: Optional[int] = None,
+                      age: int = 0) -> bool:
         """
         Llamado por ForwardingService cuando llega un INFO.
         'view' es el contenido de payload; en LSR clásico debe ser LSP de 'origin':
             {"neighbor1": cost1, "neighbor2": cost2, ...}
+        Devuelve False si la LSP es vieja/repetida (o propia): no se re-floodea ni recalcula.
         """
-        await self.state.update_lsdb(origin, view)
-        self.log.debug(f"LSDB actualizado por INFO de {origin}: {view}")
-        await self._debounced_recompute_and_advertise()
+        if origin == self.my_id:
+            return False
+        # edad máxima = LSP de retiro (la LSDB no sabe de edades del protocolo)
+        result = await self.state.update_lsdb(origin, view, seq=seq, age=age, withdrawn=age >= LSP_MAX_AGE)
+        if result == LSP_STALE:
+            self.log.debug(f"LSP vieja/duplicada de {origin} (seq={seq}) descartada")
+            return False
+        if result == LSP_WITHDRAWN:
+            self.log.warning(f"LSDB: {origin} se retiró (LSP de retiro)")
+            # si es vecino directo, no esperar su timeout de HELLO: baja ya (fail-over + INFO)
+            self.state.declare_down(origin)
+            await self._schedule_spf()
+            return True
+        if result == LSP_NEW:
+            self.log.debug(f"LSDB actualizado por INFO de {origin}: {view}")
+            await self._schedule_spf()
+        return True
 
     async def maybe_mark_topology_changed(self) -> None:
         """
         Útil cuando detectas caída/alta de vecino (p. ej., watchdog) o cambio de costo.
         """
-        await self._debounced_recompute_and_advertise()
+        await self._schedule_spf()
 
     # ------------- Internals -------------
 
     async def _periodic_info(self) -> None:
         """
-        Emite INFO periódicos con la vista local.
+        Emite INFO periódicos con la vista local (refresh con nueva secuencia aunque no cambie,
+        para que la LSP no expire en los demás).
         """
         try:
             while not self._stopping.is_set():
                 await asyncio.sleep(self.cfg.info_interval_sec)
                 try:
-                    await self._advertise_info()
+                    await self._advertise_info(refresh=True)
                 except Exception as e:
                     self.log.error(f"Error en periodic_info: {e}")
         except asyncio.CancelledError:
             pass
 
-    async def _watchdog(self) -> None:
+    async def _on_neighbor_down(self, neighbor_id: str) -> None:
         """
-        Vigila:
-        1) Vecinos directos “muertos” por falta de HELLO (se cae el enlace local).
-        2) Entradas de la LSDB cuyo INFO está viejo (nodos que ya no anuncian nada).
-        Si hay cambios, dispara recálculo + anuncio (debounced).
+        Vecino directo sin HELLO dentro del timeout (evento de State, en el deadline exacto):
+        se retira mi enlace y se dispara recálculo + anuncio (con throttling).
+        El vecino sigue configurado: su próximo HELLO repone el enlace (NEIGHBOR_UP).
         """
-        try:
-            while not self._stopping.is_set():
-                await asyncio.sleep(5.0)
-
-                changed = False
-
-                # 1) Vecinos directos sin HELLO dentro del timeout → remover mis enlaces
-                dead = await self.state.dead_neighbors(self.cfg.hello_timeout_sec)
-                if dead:
-                    snap = await self.state.get_lsdb_snapshot()
-                    my_links = snap.get(self.my_id, {})
-                    for n in dead:
-                        if n in my_links:
-                            await self.state.remove_neighbor(n)
-                            self.log.warning(f"Retiro enlace {self.my_id}—{n} por timeout de HELLO")
-                            changed = True
-
-                # 2) LSPs viejas en la LSDB (nodos que ya no publican INFO)
-                #    Regla: expira si no recibimos INFO en ~3 periodos
-                max_age = 3 * self.cfg.info_interval_sec
-                stale = await self.state.purge_stale_lsdb(max_age)
-                if stale:
-                    self.log.warning(f"LSDB: expiro info de orígenes {stale}")
-                    changed = True
-
-                if changed:
-                    await self._debounced_recompute_and_advertise()
+        if self._stopping.is_set():
+            return
+        snap = await self.state.get_lsdb_snapshot()
+        if neighbor_id in snap.get(self.my_id, {}):
+            await self.state.mark_neighbor_down(neighbor_id)
+            self.log.warning(f"Retiro enlace {self.my_id}—{neighbor_id} por timeout de HELLO")
+            # INFO disparado ya (mis enlaces no dependen del SPF); el SPF sigue con su throttling
+            await self._advertise_info()
+            await self._schedule_spf()
 
-        except asyncio.CancelledError:
+    async def _on_neighbor_up(self, neighbor_id: str) -> None:
+        """Vecino dado de baja que volvió (p. ej. reinicio tras un retiro): anuncio + SPF."""
+        if self._stopping.is_set():
             return
+        self.log.info(f"Enlace {self.my_id}—{neighbor_id} repuesto (HELLO de nuevo)")
+        await self._advertise_info()
+        await self._schedule_spf()
 
+    async def _on_link_cost_changed(self, neighbor_id: str) -> None:
+        if self._stopping.is_set():
+            return
+        info = self.state.neighbors.get(neighbor_id)
+        self.log.info(f"Costo de enlace {self.my_id}—{neighbor_id}: {info.cost if info else '-'}")
+        await self._schedule_spf()
 
-    async def _debounced_recompute_and_advertise(self) -> None:
+    async def _on_lsp_expired(self, origin: str) -> None:
+        """LSP de 'origin' vencida (State ya la purgó de la LSDB): recalcular."""
+        if self._stopping.is_set():
+            return
+        self.log.warning(f"LSDB: expiro info de origen {origin}")
+        await self._schedule_spf()
+
+    async def _schedule_spf(self) -> None:
         """
-        Debounce pequeño para agrupar cambios cercanos (por ej. múltiples INFO seguidos).
+        Agenda SPF + anuncio con throttling exponencial (sin cancelar/reiniciar timers):
+        - Si ya hay una corrida agendada, el cambio se suma a ella (cota de espera garantizada).
+          Si esa corrida ya arrancó (tomó el grafo), queda pendiente: al terminar se agenda otra.
+        - Tras un período tranquilo (2×hold sin corridas) el primer SPF va a spf_initial_delay_sec.
+        - Si los cambios siguen llegando, cada corrida espera el hold actual desde la anterior
+          y el hold se duplica hasta spf_max_hold_sec.
         """
-        # cancela el debounce previo si existe
-        if self._debounce_task and not self._debounce_task.done():
-            self._debounce_task.cancel()
-            try:
-                await self._debounce_task
-            except asyncio.CancelledError:
-                pass
+        self.spf_scheduled += 1
+        if self._spf_task and not self._spf_task.done():
+            # la corrida en curso pudo tomar el grafo antes de este cambio: otra al terminar
+            self._spf_pending = True
+            return
+        self._arm_spf()
+
+    def _arm_spf(self) -> None:
+        now = time.monotonic()
+        since = None if self._last_spf_run is None else now - self._last_spf_run
+        if since is None or since >= 2 * self._spf_hold:
+            self._spf_hold = self.cfg.spf_hold_sec
+            delay = self.cfg.spf_initial_delay_sec
+        else:
+            delay = max(self.cfg.spf_initial_delay_sec, self._spf_hold - since)
+            self._spf_hold = min(2 * self._spf_hold, self.cfg.spf_max_hold_sec)
 
         async def _job():
-            await asyncio.sleep(self.cfg.on_change_debounce_sec)
-            await self._recompute_routes()
-            await self._advertise_info()
+            await asyncio.sleep(delay)
+            self._last_spf_run = time.monotonic()
+            self._spf_pending = False
+            self.spf_executed += 1
+            try:
+                await self._recompute_routes()
+                await self._advertise_info()
+            finally:
+                # cambios que llegaron durante los awaits de esta corrida: se re-arma el
+                # throttling (corre de nuevo tras el hold), no se pierden
+                if self._spf_pending and not self._stopping.is_set():
+                    self._spf_pending = False
+                    self._arm_spf()
 
-        self._debounce_task = asyncio.create_task(_job())
+        self._spf_task = asyncio.create_task(_job())
 
     async def _recompute_routes(self) -> None:
-        graph = await self.state.build_graph(self.cfg.hello_timeout_sec)
-        if self.my_id not in graph:
-            graph[self.my_id] = {}
-        table, costs = _dijkstra_table_and_costs(graph, self.my_id)
-        # guarda tabla y costos en State
-        await self.state.set_routing_table(table)
-
+        # Vista directa sobre la LSDB compacta (sin armar el dict de dicts); no hay awaits
+        # entre tomarla y usarla, así que es consistente.
+        graph = self.state.graph_view(self.cfg.hello_timeout_sec)
+        touched = self.state.take_graph_changes()
+        if touched is None or self._touched is None:
+            self._touched = None
+        else:
+            self._touched |= touched
+        self._spf_gen += 1
+        gen = self._spf_gen
+        if self.cfg.spf_executor and len(graph) >= self.cfg.spf_offload_min_nodes:
+            # LSDB grande: SPF completo en otro proceso sobre un snapshot compacto (CSR)
+            if self._spf_pool is None:
+                self._spf_pool = ProcessPoolExecutor(max_workers=self.cfg.spf_workers)
+            snapshot = pack_graph(graph)
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._spf_pool, spf_job, snapshot, self.my_id, self.cfg.lfa)
+            if gen != self._spf_gen:
+                self.log.debug("SPF remoto descartado (hubo un recálculo más nuevo)")
+                return
+            # el grafo pudo cambiar durante el await: el árbol corresponde al snapshot
+            changed = self._spf.load(unpack_graph(snapshot), result)
+            self._lfa_key = (self._spf.tree_version, dict(self._spf.graph.get(self.my_id, {})))
+            self._lfa = result.alternates
+        else:
+            # SPF incremental: solo re-evalúa el subárbol afectado por las aristas que cambiaron
+            changed = self._spf.update(graph, self._touched)
+            if self.cfg.lfa:
+                # un SPF por vecino: solo si cambió el árbol propio o el conjunto/costo de vecinos
+                # (un cambio lejano que no mueve mi árbol deja las LFA como estaban)
+                key = (self._spf.tree_version, dict(graph[self.my_id].items()) if self.my_id in graph else {})
+                if key != self._lfa_key:
+                    self._lfa = loop_free_alternates(graph, self._spf.result)
+                    self._lfa_key = key
+                self._spf.result.alternates = self._lfa  # un SPF completo arma un result nuevo
+        self._touched = set()
         self._last_recalc_ts = time.time()
-        self.log.info(f"Tabla de ruteo actualizada ({len(table)} destinos)")
+        self.last_changed_destinations = changed
+        result = self._spf.result
+        overridden = self.state.routing.version != self._routing_version
+        # costos: el árbol pudo cambiar (distancias) sin mover ningún next hop
+        same_tree = self._spf.tree_version == self._published_tree
+        if not changed and not overridden and same_tree and result.alternates == dict(self.state.routing.alternates):
+            self.log.debug("SPF sin cambios de next hops")
+            return
+
+        table = dict(result.next_hop)
+        # guarda la tabla (dst -> next_hop) en State, con los next hops ECMP y las LFA de cada destino
+        snap = await self.state.set_routing_table(table, result.next_hops, result.alternates, result.dist)
+        self._routing_version = snap.version
+        self._published_tree = self._spf.tree_version
+        if not changed:
+            self.log.debug(f"Tabla republicada sin cambios de next hops (costos/LFA, {len(table)} destinos)")
+            return
+
+        self.log.info(f"Tabla de ruteo actualizada ({len(table)} destinos, cambiaron {sorted(changed)})")
         await self.state.print_routing_table()
 
-    async def _advertise_info(self) -> None:
+    def next_seq(self) -> int:
+        self._seq = max(self._seq + 1, int(time.time() * 1000))
+        return self._seq
+
+    @property
+    def seq(self) -> int:
+        """Última secuencia emitida (para el snapshot de warm start)."""
+        return self._seq
+
+    def restore_seq(self, seq: int) -> None:
+        # nunca retroceder: una LSP nueva con seq menor sería descartada como vieja
+        self._seq = max(self._seq, int(seq))
+
+    async def _advertise_info(self, refresh: bool = False) -> None:
         """
         Construye y emite INFO según configuración:
           - LSP clásico: mis enlaces directos (State.neighbors)
           - (Compat) “tabla hacia destinos”: routing_table en pesos uniformes
-        Solo envía si hay cambios respecto al último anuncio (para evitar ruido).
+        Solo envía si hay cambios respecto al último anuncio (para evitar ruido),
+        salvo refresh=True (ticker periódico).
         """
         if self.cfg.advertise_links_from_neighbors_table:
             # anunciar mis enlaces directos (LSP de mi nodo)
@@ -303,11 +393,11 @@ class RoutingLSRService:
             view = {dst: 1.0 for dst in routing.keys()}
 
         # no anunciar si no hay cambios
-        if view == self._last_advertised_view:
+        if view == self._last_advertised_view and not refresh:
             return
         self._last_advertised_view = dict(view)
 
-        pkt = build_info(self.my_id, view)
+        pkt = build_info(self.my_id, view, seq=self.next_seq())
         payload = pkt.to_publish_dict()
         # broadcast a todos los vecinos directos
         channels = [self.neighbor_map[nid] for nid in self.neighbor_map.keys() if nid != self.my_id]
@@ -0,0 +1,322 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+
+class NodeIndex:
+    """
+    Interning de ids de nodo → enteros densos (0..n-1).
+    Los ids no se liberan: un nodo que desaparece conserva su entero por si vuelve.
+    """
+    __slots__ = ("_ids", "names")
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def intern(self, name: str) -> int:
+        i = self._ids.get(name)
+        if i is None:
+            i = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def get(self, name: str) -> Optional[int]:
+        return self._ids.get(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._ids
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class AdjacencyStore:
+    """
+    LSDB compacta indexada por enteros:
+      - por origen, una fila ordenada de vecinos array('i') + costos array('d')
+      - por nodo, los orígenes que lo anuncian (aristas de entrada), para simetrizar sin copiar
+      - 'dirty': nodos cuya adyacencia efectiva pudo cambiar desde el último take_dirty()
+    La API es incremental (fila completa o arista suelta); GraphView la expone al SPF sin
+    armar el dict de dicts.
+    """
+
+    def __init__(self) -> None:
+        self.index = NodeIndex()
+        self._dst: List[Optional[array]] = []   # origen -> vecinos (ordenados) o None
+        self._w: List[Optional[array]] = []     # origen -> costos (alineados con _dst)
+        self._src: List[array] = []             # nodo -> orígenes que lo anuncian
+        self._rows = 0
+        self._dirty: Set[int] = set()
+        self.version = 0
+
+    # ------------- lectura -------------
+
+    def __contains__(self, origin: object) -> bool:
+        i = self.index.get(origin) if isinstance(origin, str) else None
+        return i is not None and self._dst[i] is not None
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def origins(self) -> Iterator[str]:
+        names = self.index.names
+        for i, row in enumerate(self._dst):
+            if row is not None:
+                yield names[i]
+
+    def links(self, origin: str) -> Optional[Dict[str, float]]:
+        """Copia {vecino: costo} de la fila de 'origin' (None si no hay LSP)."""
+        i = self.index.get(origin)
+        if i is None or self._dst[i] is None:
+            return None
+        names = self.index.names
+        return {names[v]: w for v, w in zip(self._dst[i], self._w[i])}
+
+    def row(self, i: int) -> Optional[Tuple[array, array]]:
+        """Fila cruda (vecinos, costos) del nodo entero 'i', sin copiar."""
+        dst = self._dst[i]
+        return None if dst is None else (dst, self._w[i])
+
+    def sources(self, i: int) -> array:
+        """Orígenes que anuncian una arista hacia 'i' (sin copiar)."""
+        return self._src[i]
+
+    def weight(self, u: int, v: int) -> Optional[float]:
+        dst = self._dst[u]
+        if dst is None:
+            return None
+        k = bisect_left(dst, v)
+        if k < len(dst) and dst[k] == v:
+            return self._w[u][k]
+        return None
+
+    def nbytes(self) -> int:
+        """Bytes de los buffers de adyacencia (sin contar el interning)."""
+        total = 0
+        for arr in (*self._dst, *self._w, *self._src):
+            if arr is not None:
+                total += arr.buffer_info()[1] * arr.itemsize
+        return total
+
+    # ------------- escritura (incremental) -------------
+
+    def _intern(self, name: str) -> int:
+        i = self.index.intern(name)
+        while len(self._dst) <= i:
+            self._dst.append(None)
+            self._w.append(None)
+            self._src.append(array("i"))
+        return i
+
+    def set_links(self, origin: str, links: Dict[str, float]) -> bool:
+        """Reemplaza la fila de 'origin'. Devuelve False si no cambió nada."""
+        u = self._intern(origin)
+        pairs = sorted((self._intern(v), float(w)) for v, w in links.items())
+        dst = array("i", [v for v, _ in pairs])
+        wts = array("d", [w for _, w in pairs])
+        old_dst, old_w = self._dst[u], self._w[u]
+        if old_dst is not None and old_dst == dst and old_w == wts:
+            return False
+
+        old = set(old_dst) if old_dst is not None else set()
+        new = set(dst)
+        for v in old - new:
+            self._src[v].remove(u)
+        for v in new - old:
+            self._src[v].append(u)
+        if old_dst is None:
+            self._rows += 1
+        self._dst[u], self._w[u] = dst, wts
+        self._touch(u, old | new)
+        return True
+
+    def set_link(self, origin: str, neighbor: str, cost: float) -> bool:
+        """Agrega/actualiza una sola arista origin→neighbor."""
+        u = self._intern(origin)
+        v = self._intern(neighbor)
+        dst, wts = self._dst[u], self._w[u]
+        if dst is None:
+            dst, wts = self._dst[u], self._w[u] = array("i"), array("d")
+            self._rows += 1
+        k = bisect_left(dst, v)
+        if k < len(dst) and dst[k] == v:
+            if wts[k] == float(cost):
+                return False
+            wts[k] = float(cost)
+        else:
+            dst.insert(k, v)
+            wts.insert(k, float(cost))
+            self._src[v].append(u)
+        self._touch(u, (v,))
+        return True
+
+    def remove_link(self, origin: str, neighbor: str) -> bool:
+        u = self.index.get(origin)
+        v = self.index.get(neighbor)
+        if u is None or v is None or self._dst[u] is None:
+            return False
+        dst = self._dst[u]
+        k = bisect_left(dst, v)
+        if k >= len(dst) or dst[k] != v:
+            return False
+        del dst[k]
+        del self._w[u][k]
+        self._src[v].remove(u)
+        self._touch(u, (v,))
+        return True
+
+    def drop(self, origin: str) -> bool:
+        """Elimina la fila de 'origin' (LSP purgada)."""
+        u = self.index.get(origin)
+        if u is None or self._dst[u] is None:
+            return False
+        old = self._dst[u]
+        for v in old:
+            self._src[v].remove(u)
+        self._dst[u] = self._w[u] = None
+        self._rows -= 1
+        self._touch(u, old)
+        return True
+
+    def clear(self) -> None:
+        for origin in list(self.origins()):
+            self.drop(origin)
+
+    # ------------- cambios -------------
+
+    def _touch(self, u: int, neighbors) -> None:
+        self.version += 1
+        self._dirty.add(u)
+        self._dirty.update(neighbors)
+
+    def mark_dirty(self, name: str) -> None:
+        """Marca 'name' y sus adyacentes (p. ej. cambió su liveness → cambian sus aristas efectivas)."""
+        i = self.index.get(name)
+        if i is None:
+            return
+        self._touch(i, self._src[i])
+        if self._dst[i] is not None:
+            self._dirty.update(self._dst[i])
+
+    def take_dirty(self) -> Set[str]:
+        """Nombres marcados desde la llamada anterior (un solo consumidor: el SPF)."""
+        names = self.index.names
+        out = {names[i] for i in self._dirty}
+        self._dirty.clear()
+        return out
+
+
+class LSDBView(Mapping):
+    """Vista de solo lectura {origen: {vecino: costo}} sobre el AdjacencyStore (compat)."""
+
+    def __init__(self, store: AdjacencyStore) -> None:
+        self._store = store
+
+    def __getitem__(self, origin: str) -> Dict[str, float]:
+        links = self._store.links(origin)
+        if links is None:
+            raise KeyError(origin)
+        return links
+
+    def __iter__(self) -> Iterator[str]:
+        return self._store.origins()
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+
+class _Row(Mapping):
+    """Aristas efectivas de un nodo en un GraphView (calculadas al primer acceso)."""
+    __slots__ = ("_view", "_i", "_items")
+
+    def __init__(self, view: "GraphView", i: int) -> None:
+        self._view = view
+        self._i = i
+        self._items: Optional[Dict[str, float]] = None
+
+    def _edges(self) -> Dict[str, float]:
+        if self._items is None:
+            self._items = self._view._edges(self._i)
+        return self._items
+
+    def __getitem__(self, v: str) -> float:
+        return self._edges()[v]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._edges())
+
+    def __len__(self) -> int:
+        return len(self._edges())
+
+    def items(self):
+        return self._edges().items()
+
+
+class GraphView(Mapping):
+    """
+    Grafo {u: {v: w}} que el SPF recorre directamente sobre el AdjacencyStore, sin copiar
+    la LSDB. Reproduce las reglas de State.build_graph():
+      - arista u→v se usa si no hay filtro de liveness, si v está vivo o si v es el nodo propio
+      - 'scope' limita el filtro a esos nodos (mis vecinos, los únicos con evidencia de HELLO);
+        los demás se dan por vivos mientras su LSP no venza
+      - se simetriza: si v no anuncia v→u, se usa el costo de u→v (lo anunciado gana), con el
+        mismo filtro aplicado a la arista resultante (un vecino caído no vuelve por su LSP vieja)
+    """
+
+    def __init__(self, store: AdjacencyStore, self_id: str, alive: Optional[Set[str]] = None,
+                 scope: Optional[Set[str]] = None) -> None:
+        self._store = store
+        index = store.index
+        self._self = index.get(self_id)
+        self._alive: Optional[Set[int]] = None
+        self._scope: Optional[Set[int]] = None
+        if alive is not None:
+            self._alive = {i for i in (index.get(n) for n in alive) if i is not None}
+        if scope is not None:
+            self._scope = {i for i in (index.get(n) for n in scope) if i is not None}
+
+    def _kept(self, v: int) -> bool:
+        if self._alive is None or v == self._self or v in self._alive:
+            return True
+        return self._scope is not None and v not in self._scope
+
+    def _present(self, i: int) -> bool:
+        return self._store._dst[i] is not None or len(self._store._src[i]) > 0
+
+    def _edges(self, u: int) -> Dict[str, float]:
+        store = self._store
+        names = store.index.names
+        out: Dict[str, float] = {}
+        row = store.row(u)
+        if row is not None:
+            for v, w in zip(*row):
+                if self._kept(v):
+                    out[names[v]] = w
+        if self._kept(u):  # aristas s→u usadas al revés (u→s), si s también pasa el filtro
+            for s in store.sources(u):
+                name = names[s]
+                if name not in out and self._kept(s):
+                    out[name] = store.weight(s, u)
+        return out
+
+    def __getitem__(self, u: str) -> Mapping:
+        i = self._store.index.get(u)
+        if i is None or not self._present(i):
+            raise KeyError(u)
+        return _Row(self, i)
+
+    def __contains__(self, u: object) -> bool:
+        i = self._store.index.get(u) if isinstance(u, str) else None
+        return i is not None and self._present(i)
+
+    def __iter__(self) -> Iterator[str]:
+        names = self._store.index.names
+        for i in range(len(names)):
+            if self._present(i):
+                yield names[i]
+
+    def __len__(self) -> int:
+        return sum(1 for i in range(len(self._store.index)) if self._present(i))
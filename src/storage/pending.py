@@ -0,0 +1,78 @@
+from __future__ import annotations
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Iterator, List
+
+from src.utils.timers import ExpiryScheduler
+
+
+class PendingQueue:
+    """
+    Paquetes retenidos por destino mientras no hay ruta (hold-and-release).
+      - hold(dst, item): encola; el primer paquete de un destino arma su deadline
+      - release(dst): saca todo lo del destino en orden de llegada (hay ruta → unicast)
+      - al vencer el deadline se llama on_expire(dst); el dueño saca con expire(dst)
+    Acotada por destino y en total: si no hay lugar, hold() devuelve False (el llamador
+    decide; no se desaloja lo ya retenido, así se conserva el orden de cada flujo).
+    Métricas: held, released, expired, overflow (paquetes).
+    """
+
+    def __init__(self,
+                 on_expire: Callable[[Hashable], None],
+                 hold_sec: float = 1.0,
+                 max_per_dst: int = 64,
+                 max_total: int = 4096) -> None:
+        self.hold_sec = hold_sec
+        self.max_per_dst = max_per_dst
+        self.max_total = max_total
+        self._queues: Dict[Hashable, Deque[Any]] = {}
+        self._total = 0
+        self._timers = ExpiryScheduler(on_expire)
+        self.held = 0
+        self.released = 0
+        self.expired = 0
+        self.overflow = 0
+
+    def hold(self, dst: Hashable, item: Any) -> bool:
+        q = self._queues.get(dst)
+        if self._total >= self.max_total or (q is not None and len(q) >= self.max_per_dst):
+            self.overflow += 1
+            return False
+        if q is None:
+            q = self._queues[dst] = deque()
+            self._timers.arm(dst, self.hold_sec)
+        q.append(item)
+        self._total += 1
+        self.held += 1
+        return True
+
+    def _take(self, dst: Hashable) -> List[Any]:
+        q = self._queues.pop(dst, None)
+        if not q:
+            return []
+        self._timers.cancel(dst)
+        self._total -= len(q)
+        return list(q)
+
+    def release(self, dst: Hashable) -> List[Any]:
+        items = self._take(dst)
+        self.released += len(items)
+        return items
+
+    def expire(self, dst: Hashable) -> List[Any]:
+        items = self._take(dst)
+        self.expired += len(items)
+        return items
+
+    def destinations(self) -> Iterator[Hashable]:
+        return iter(list(self._queues))
+
+    def clear(self) -> None:
+        self._timers.close()
+        self._queues.clear()
+        self._total = 0
+
+    def __contains__(self, dst: object) -> bool:
+        return dst in self._queues
+
+    def __len__(self) -> int:
+        return self._total
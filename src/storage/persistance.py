@@ -1,8 +1,67 @@
 from __future__ import annotations
 import json
-from typing import Dict
+import os
+import tempfile
+import zlib
+from typing import Any, Dict
 from pathlib import Path
 
+# Formatos de snapshot
+JSON = "json"
+BINARY = "binary"   # JSON compacto comprimido con zlib, con cabecera mágica
+
+_MAGIC = b"LSRS\x01"  # nunca inicia un JSON válido → load_state autodetecta el formato
+
+
+def dump_state(path: str, data: Dict[str, Any], fmt: str = JSON) -> None:
+    """
+    Guarda un snapshot de forma atómica: escribe a un temporal en el mismo directorio,
+    fsync y os.replace() encima del archivo final. Un lector (o un reinicio a mitad de
+    escritura) ve el snapshot anterior completo o el nuevo completo, nunca uno truncado.
+    """
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == BINARY:
+        body = _MAGIC + zlib.compress(
+            json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+    else:
+        body = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+    fd, tmp = tempfile.mkstemp(prefix=f".{p.name}.", suffix=".tmp", dir=str(p.parent))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)  # mkstemp crea con 0600
+        os.replace(tmp, p)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def load_state(path: str) -> Dict[str, Any]:
+    """
+    Carga un snapshot (JSON o binario, autodetectado). Devuelve dict vacío si no existe.
+    Lanza ValueError si el archivo está corrupto.
+    """
+    p = Path(path)
+    if not p.exists():
+        return {}
+    raw = p.read_bytes()
+    try:
+        if raw.startswith(_MAGIC):
+            raw = zlib.decompress(raw[len(_MAGIC):])
+        data = json.loads(raw.decode("utf-8"))
+    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"snapshot inválido en {path}: {e}") from e
+    if not isinstance(data, dict):
+        raise ValueError(f"snapshot inválido en {path}: no es un objeto")
+    return data
+
 
 def dump_state_json(path: str,
                     node_id: str,
@@ -16,17 +75,11 @@ def dump_state_json(path: str,
         "lsdb": lsdb,
         "routing_table": routing_table,
     }
-    Path(path).parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    dump_state(path, data, JSON)
 
 
 def load_state_json(path: str) -> Dict:
     """
     Carga snapshot (si existe). Devuelve dict vacío si no existe.
     """
-    p = Path(path)
-    if not p.exists():
-        return {}
-    with open(p, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return load_state(path)
@@ -1,40 +1,129 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Mapping, Optional, Set, Tuple
+from types import MappingProxyType
+import hashlib
 import time
 import asyncio
+import zlib
 
-class TTLCache:
+from src.storage.adjacency import AdjacencyStore, GraphView, LSDBView
+from src.utils.timers import ExpiryScheduler
+
+# Resultado de State.update_lsdb
+LSP_NEW = "new"          # enlaces distintos a los guardados → recalcular rutas y re-flood
+LSP_REFRESH = "refresh"  # LSP más nueva con los mismos enlaces → solo refresca edad (re-flood, sin SPF)
+LSP_STALE = "stale"      # secuencia vieja o repetida → descartar (sin SPF ni re-flood)
+LSP_WITHDRAWN = "withdrawn"  # LSP de retiro: origen fuera de la LSDB ya → SPF y re-flood
+
+# Eventos (State.on_event)
+NEIGHBOR_DOWN = "neighbor_down"    # vecino sin HELLO dentro de hello_timeout_sec
+NEIGHBOR_UP = "neighbor_up"        # vecino dado de baja que volvió a mandar HELLO (enlace repuesto)
+LSP_EXPIRED = "lsp_expired"        # LSP de un origen sin refresh dentro de lsp_max_age_sec (ya purgada)
+ROUTES_CHANGED = "routes_changed"  # se publicó un RoutingSnapshot nuevo (id = su versión)
+LINK_COST_CHANGED = "link_cost_changed"  # cambió el costo de mi enlace a un vecino (id = vecino)
+
+
+class SeenCache:
     """
-    Cache de 'msg_id' vistos con TTL (para de-dupe de INFO/MESSAGE).
+    Cache de 'msg_id' vistos con TTL (para de-dupe de INFO/MESSAGE), acotado en memoria.
+    - dict en orden de inserción: con TTL fijo y reloj monotónico el orden de inserción
+      es también el orden de expiración, así que expirar es sacar de la cabeza (O(1) amortizado)
+    - re-marcar una clave la mueve al final (se refresca su TTL)
+    - max_entries: tope duro; si se llena antes de que expire nada, se desaloja la más vieja (LRU)
+    - compact=True: guarda un hash blake2b de 8 bytes (int) en vez del string completo
     """
-    def __init__(self, ttl_seconds: int = 120) -> None:
+    def __init__(self, ttl_seconds: float = 120, max_entries: int = 100_000, compact: bool = False) -> None:
         self.ttl = ttl_seconds
-        self._store: Dict[str, float] = {}
+        self.max_entries = max_entries
+        self.compact = compact
+        self._store: Dict[Hashable, float] = {}  # clave -> expiración (monotonic), en orden de expiración
+        self.evicted = 0  # desalojos por tope (no por TTL)
+
+    def _key(self, key: str) -> Hashable:
+        if not self.compact:
+            return key
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
 
     def add(self, key: str) -> None:
-        self._store[key] = time.time() + self.ttl
+        now = time.monotonic()
+        k = self._key(key)
+        self._store.pop(k, None)  # re-insertar al final
+        self._store[k] = now + self.ttl
+        self._expire(now)
+        while len(self._store) > self.max_entries:
+            del self._store[next(iter(self._store))]
+            self.evicted += 1
 
     def __contains__(self, key: str) -> bool:
-        exp = self._store.get(key)
+        k = self._key(key)
+        exp = self._store.get(k)
         if exp is None:
             return False
-        if exp < time.time():
-            self._store.pop(key, None)
+        if exp < time.monotonic():
+            self._store.pop(k, None)
             return False
         return True
 
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def _expire(self, now: float) -> None:
+        store = self._store
+        while store:
+            k = next(iter(store))
+            if store[k] >= now:
+                break
+            del store[k]
+
     def purge(self) -> None:
-        now = time.time()
-        expired = [k for k, exp in self._store.items() if exp < now]
-        for k in expired:
-            self._store.pop(k, None)
+        self._expire(time.monotonic())
+
+
+@dataclass(frozen=True)
+class RoutingSnapshot:
+    """
+    Tabla de ruteo inmutable (dst -> next_hop) con número de versión.
+    set_routing_table() publica una nueva reemplazando la referencia completa (copy-on-write),
+    así que el plano de datos la lee sin lock: una referencia tomada sigue siendo consistente
+    aunque el control plane publique otra mientras tanto.
+    Comparar 'version' alcanza para saber si la tabla cambió.
+    'hops' guarda los next hops de igual costo (ECMP) solo de los destinos que tienen más de uno;
+    con 'flow' se elige uno con un hash estable (crc32), así un flujo no se reordena.
+    'alternates' es el next hop de respaldo libre de lazos (LFA) por destino, para fail_over().
+    'costs' es el costo total por destino que calculó el SPF (solo para mostrar la tabla).
+    """
+    version: int = 0
+    table: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    hops: Mapping[str, Tuple[str, ...]] = field(default_factory=lambda: MappingProxyType({}))
+    alternates: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    costs: Mapping[str, float] = field(default_factory=lambda: MappingProxyType({}))
+
+    def next_hop(self, dst: str, flow: Optional[Tuple[Any, ...]] = None) -> Optional[str]:
+        hops = self.hops.get(dst)
+        if flow is None or not hops:
+            return self.table.get(dst)
+        key = "\x1f".join("" if f is None else str(f) for f in flow).encode("utf-8")
+        return hops[zlib.crc32(key) % len(hops)]
+
+    def next_hops(self, dst: str) -> Tuple[str, ...]:
+        hops = self.hops.get(dst)
+        if hops:
+            return hops
+        nh = self.table.get(dst)
+        return (nh,) if nh else ()
+
+    def __len__(self) -> int:
+        return len(self.table)
 
 
 @dataclass
 class NeighborInfo:
     cost: float = 1.0
     last_hello_ts: float = field(default_factory=lambda: 0.0)
+    # eco de HELLO para medir RTT: último timestamp del vecino y cuándo llegó (reloj monotónico local)
+    peer_ts: Optional[float] = None
+    peer_rx: float = 0.0
 
 
 @dataclass
@@ -42,18 +131,113 @@ class State:
     """
     Estado compartido del nodo:
     - neighbors: información de enlaces directos y último HELLO recibido
-    - lsdb: base de datos de estado de enlaces (LSR)
-    - routing_table: destino -> next_hop
+    - adjacency: LSDB compacta (ids internados + arrays); 'lsdb' es su vista {origen: {vecino: costo}}
+    - routing: RoutingSnapshot inmutable (destino -> next_hop), lectura sin lock
     - seen_cache: ids de mensajes vistos (de-dupe)
+    - alive: vecinos con HELLO vigente, mantenido por eventos (ver enable_liveness)
     """
     node_id: str
     neighbors: Dict[str, NeighborInfo] = field(default_factory=dict)
-    lsdb: Dict[str, Dict[str, float]] = field(default_factory=dict)  # por nodo: {vecino: costo}
+    adjacency: AdjacencyStore = field(default_factory=AdjacencyStore)  # LSDB: por nodo {vecino: costo}
     lsdb_ts: dict[str, float] = field(default_factory=dict)  # <-- nuevo: último INFO por origin
-    routing_table: Dict[str, str] = field(default_factory=dict)      # dst -> next_hop
-    seen_cache: TTLCache = field(default_factory=lambda: TTLCache(120))
+    lsdb_seq: Dict[str, int] = field(default_factory=dict)   # última secuencia aceptada por origin
+    routing: RoutingSnapshot = field(default_factory=RoutingSnapshot)  # dst -> next_hop (copy-on-write)
+    seen_cache: SeenCache = field(default_factory=lambda: SeenCache(120))
+
+    alive: Set[str] = field(default_factory=set)
+    # nodos sujetos al filtro de HELLO: todo el que fue vecino (uno retirado sigue filtrado
+    # hasta que vuelva, aunque su LSP vieja aún lo anuncie)
+    hello_scope: Set[str] = field(default_factory=set)
+
+    # liveness por eventos: None = sin seguimiento (las consultas escanean como antes)
+    hello_timeout_sec: Optional[float] = None
+    lsp_max_age_sec: Optional[float] = None
 
     _lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+    _timers: Optional[ExpiryScheduler] = field(default=None, repr=False)
+    _listeners: Dict[str, List[Callable[[str], Awaitable[None]]]] = field(default_factory=dict, repr=False)
+    _listener_tasks: Set[asyncio.Task] = field(default_factory=set, repr=False)
+
+    # -----------------------------
+    # Liveness por eventos (vencimientos exactos, sin polling)
+    # -----------------------------
+    def enable_liveness(self, hello_timeout_sec: float, lsp_max_age_sec: Optional[float] = None) -> None:
+        """
+        Activa el seguimiento por deadlines: cada HELLO re-arma el vencimiento del vecino y
+        cada LSP aceptada el de su origen. Al vencer se actualiza 'alive' / se purga la LSP
+        y se notifica a los listeners (NEIGHBOR_DOWN / LSP_EXPIRED) en el momento exacto.
+        """
+        self.hello_timeout_sec = hello_timeout_sec
+        self.lsp_max_age_sec = lsp_max_age_sec
+        if self._timers is None:
+            self._timers = ExpiryScheduler(self._on_expire)
+        now = time.time()
+        for n in list(self.alive):
+            self._set_alive(n, False)
+        for n, info in self.neighbors.items():
+            if info.last_hello_ts:
+                self._arm_neighbor(n, info.last_hello_ts, now)
+        if lsp_max_age_sec is not None:
+            for origin, ts in self.lsdb_ts.items():
+                self._timers.arm((LSP_EXPIRED, origin), lsp_max_age_sec - (now - ts))
+
+    def disable_liveness(self) -> None:
+        if self._timers:
+            self._timers.close()
+        self._timers = None
+        self.hello_timeout_sec = None
+        self.lsp_max_age_sec = None
+        for t in self._listener_tasks:
+            t.cancel()
+
+    def on_event(self, kind: str, callback: Callable[[str], Awaitable[None]]) -> None:
+        """Registra async callback(id) para NEIGHBOR_DOWN/UP, LSP_EXPIRED, ROUTES_CHANGED o LINK_COST_CHANGED."""
+        self._listeners.setdefault(kind, []).append(callback)
+
+    def _set_alive(self, neighbor_id: str, alive: bool) -> None:
+        # la liveness filtra aristas del grafo: un cambio ensucia las del vecino
+        if alive != (neighbor_id in self.alive):
+            if alive:
+                self.alive.add(neighbor_id)
+            else:
+                self.alive.discard(neighbor_id)
+            self.adjacency.mark_dirty(neighbor_id)
+
+    def _arm_neighbor(self, neighbor_id: str, ts: float, now: float) -> None:
+        remaining = self.hello_timeout_sec - (now - ts)
+        if remaining > 0:
+            self._set_alive(neighbor_id, True)
+            self._timers.arm((NEIGHBOR_DOWN, neighbor_id), remaining)
+        else:
+            self._set_alive(neighbor_id, False)
+            self._timers.cancel((NEIGHBOR_DOWN, neighbor_id))
+
+    def _on_expire(self, key: Tuple[str, str]) -> None:
+        # Callback síncrono del scheduler: ningún método toma el lock a través de un await,
+        # así que mutar aquí no deja a nadie a medio camino.
+        kind, ident = key
+        if kind == NEIGHBOR_DOWN:
+            self._set_alive(ident, False)
+        elif kind == LSP_EXPIRED:
+            self.adjacency.drop(ident)
+            self.lsdb_ts.pop(ident, None)
+            self.lsdb_seq.pop(ident, None)
+        self._emit(kind, ident)
+
+    def _emit(self, kind: str, ident: str) -> None:
+        for cb in self._listeners.get(kind, ()):
+            task = asyncio.create_task(cb(ident))
+            self._listener_tasks.add(task)
+            task.add_done_callback(self._listener_tasks.discard)
+
+    def _alive_set(self, hello_timeout_sec: float, now: float) -> Set[str]:
+        """Vecinos con HELLO dentro del timeout: el set mantenido si coincide el timeout, si no escaneo."""
+        if self._timers is not None and hello_timeout_sec == self.hello_timeout_sec:
+            return self.alive
+        return {
+            n for n, info in self.neighbors.items()
+            if info.last_hello_ts and (now - info.last_hello_ts) <= hello_timeout_sec
+        }
 
     # -----------------------------
     # Vecinos directos
@@ -61,47 +245,141 @@ class State:
     async def set_neighbors(self, initial: List[Tuple[str, float]]) -> None:
         async with self._lock:
             self.neighbors = {n: NeighborInfo(cost=c) for n, c in initial}
-            self.lsdb[self.node_id] = {n: c for n, c in initial}
+            self.hello_scope.update(self.neighbors)
+            self.adjacency.set_links(self.node_id, {n: c for n, c in initial})
+            for n in list(self.alive):
+                if self._timers is not None:
+                    self._timers.cancel((NEIGHBOR_DOWN, n))
+                self._set_alive(n, False)
 
     async def add_neighbor(self, neighbor_id: str, cost: float = 1.0) -> None:
         async with self._lock:
             self.neighbors[neighbor_id] = NeighborInfo(cost=cost)
-            self.lsdb.setdefault(self.node_id, {})[neighbor_id] = cost
+            self.hello_scope.add(neighbor_id)
+            self.adjacency.set_link(self.node_id, neighbor_id, cost)
+            self._set_alive(neighbor_id, False)  # vivo recién con su HELLO
 
     async def remove_neighbor(self, neighbor_id: str) -> None:
         async with self._lock:
             self.neighbors.pop(neighbor_id, None)
-            if self.node_id in self.lsdb:
-                self.lsdb[self.node_id].pop(neighbor_id, None)
+            self.adjacency.remove_link(self.node_id, neighbor_id)
+            self._set_alive(neighbor_id, False)
+            if self._timers is not None:
+                self._timers.cancel((NEIGHBOR_DOWN, neighbor_id))
+
+    async def mark_neighbor_down(self, neighbor_id: str) -> None:
+        """
+        Baja de un vecino configurado (timeout o retiro): se saca mi enlace y su liveness,
+        pero se conserva la entrada (costo) para que su próximo HELLO lo reponga.
+        """
+        async with self._lock:
+            info = self.neighbors.get(neighbor_id)
+            if info is not None:
+                info.last_hello_ts = 0.0
+                info.peer_ts = None
+            self.adjacency.remove_link(self.node_id, neighbor_id)
+            self._set_alive(neighbor_id, False)
+            if self._timers is not None:
+                self._timers.cancel((NEIGHBOR_DOWN, neighbor_id))
 
     async def touch_hello(self, neighbor_id: str, now: Optional[float] = None) -> None:
         ts = now if now is not None else time.time()
+        came_back = False
         async with self._lock:
             info = self.neighbors.get(neighbor_id)
             if info:
                 info.last_hello_ts = ts
+                # si estaba dado de baja, su enlace vuelve a la LSDB con el último costo
+                came_back = self.adjacency.set_link(self.node_id, neighbor_id, info.cost)
+                if self._timers is not None:
+                    self._arm_neighbor(neighbor_id, ts, time.time())
+        if came_back:
+            self._emit(NEIGHBOR_UP, neighbor_id)
 
     async def dead_neighbors(self, timeout_sec: float) -> List[str]:
         now = time.time()
         async with self._lock:
-            return [
-                n for n, info in self.neighbors.items()
-                if info.last_hello_ts and (now - info.last_hello_ts) > timeout_sec
-            ]
+            alive = self._alive_set(timeout_sec, now)
+            return [n for n, info in self.neighbors.items() if info.last_hello_ts and n not in alive]
 
-    async def update_link_cost(self, neighbor_id: str, cost: float = 1.0) -> None:
+    async def update_link_cost(self, neighbor_id: str, cost: float = 1.0) -> bool:
+        """Cambia el costo de mi enlace; si cambió, avisa a LINK_COST_CHANGED (el LSR recalcula)."""
         async with self._lock:
-            if neighbor_id in self.neighbors:
-                self.neighbors[neighbor_id].cost = cost
-                self.lsdb.setdefault(self.node_id, {})[neighbor_id] = cost
+            info = self.neighbors.get(neighbor_id)
+            if info is None or info.cost == cost:
+                return False
+            info.cost = cost
+            self.adjacency.set_link(self.node_id, neighbor_id, cost)
+        self._emit(LINK_COST_CHANGED, neighbor_id)
+        return True
+
+    def declare_down(self, neighbor_id: str) -> bool:
+        """
+        Baja explícita de un vecino (p. ej. mandó su LSP de retiro): NEIGHBOR_DOWN ya,
+        sin esperar hello_timeout_sec. Devuelve False si ya no estaba vivo.
+        """
+        info = self.neighbors.get(neighbor_id)
+        if info is not None:
+            info.last_hello_ts = 0.0
+        if neighbor_id not in self.alive:
+            return False
+        if self._timers is not None:
+            self._timers.cancel((NEIGHBOR_DOWN, neighbor_id))
+        self._on_expire((NEIGHBOR_DOWN, neighbor_id))
+        return True
+
+    def note_peer_ts(self, neighbor_id: str, ts: float, rx: float) -> None:
+        """Guarda el timestamp que mandó el vecino en su HELLO, para devolvérselo en el eco."""
+        info = self.neighbors.get(neighbor_id)
+        if info is not None:
+            info.peer_ts = ts
+            info.peer_rx = rx
+
+    def hello_echoes(self, now: float) -> Dict[str, List[float]]:
+        """{vecino: [su ts, tiempo retenido aquí]} para el payload de mi próximo HELLO."""
+        return {
+            n: [info.peer_ts, round(now - info.peer_rx, 6)]
+            for n, info in self.neighbors.items() if info.peer_ts is not None
+        }
 
     # -----------------------------
     # LSDB
     # -----------------------------
-    async def update_lsdb(self, origin: str, links: dict[str, float]) -> None:
+    async def update_lsdb(self,
+                          origin: str,
+                          links: dict[str, float],
+                          seq: Optional[int] = None,
+                          age: float = 0.0,
+                          withdrawn: bool = False) -> str:
+        """
+        Integra la LSP de 'origin' comparando su secuencia con la guardada.
+        Devuelve LSP_NEW, LSP_REFRESH, LSP_STALE o LSP_WITHDRAWN (ver arriba).
+        Sin 'seq' (nodos de otros grupos) se acepta siempre y se compara por contenido.
+        withdrawn=True es una LSP de retiro (flush, como el MaxAge de OSPF; lo decide el LSR por
+        la edad): se borra el origen sin esperar su vencimiento. Su seq se conserva para
+        descartar copias viejas en vuelo.
+        """
         async with self._lock:
-            self.lsdb[origin] = dict(links)
-            self.lsdb_ts[origin] = time.time()
+            cur_seq = self.lsdb_seq.get(origin)
+            if seq is not None and cur_seq is not None and seq <= cur_seq:
+                return LSP_STALE
+
+            if withdrawn:
+                if seq is not None:
+                    self.lsdb_seq[origin] = seq
+                self.adjacency.drop(origin)
+                self.lsdb_ts.pop(origin, None)
+                if self._timers is not None:
+                    self._timers.cancel((LSP_EXPIRED, origin))
+                return LSP_WITHDRAWN
+
+            changed = self.adjacency.set_links(origin, links)
+            self.lsdb_ts[origin] = time.time() - age  # edad → momento de originación
+            if seq is not None:
+                self.lsdb_seq[origin] = seq
+            if self._timers is not None and self.lsp_max_age_sec is not None and origin != self.node_id:
+                self._timers.arm((LSP_EXPIRED, origin), self.lsp_max_age_sec - age)
+            return LSP_NEW if changed else LSP_REFRESH
 
     async def purge_stale_lsdb(self, max_age_sec: float) -> list[str]:
         """Elimina orígenes cuyo INFO está viejo. Devuelve la lista de purgados."""
@@ -110,123 +388,152 @@ class State:
         async with self._lock:
             for origin, ts in list(self.lsdb_ts.items()):
                 if (now - ts) > max_age_sec:
-                    self.lsdb.pop(origin, None)
+                    self.adjacency.drop(origin)
                     self.lsdb_ts.pop(origin, None)
+                    self.lsdb_seq.pop(origin, None)
+                    if self._timers is not None:
+                        self._timers.cancel((LSP_EXPIRED, origin))
                     removed.append(origin)
         return removed
 
+    @property
+    def lsdb(self) -> LSDBView:
+        """Vista de solo lectura {origen: {vecino: costo}} (cada fila es una copia)."""
+        return LSDBView(self.adjacency)
+
     async def get_lsdb_snapshot(self) -> Dict[str, Dict[str, float]]:
         async with self._lock:
-            return {k: dict(v) for k, v in self.lsdb.items()}
+            return dict(self.lsdb.items())
+
+    def graph_view(self, hello_timeout_sec: float | None = None) -> GraphView:
+        """
+        Grafo para el SPF directo sobre la LSDB compacta (sin copiar), con las mismas reglas
+        que build_graph(). Síncrono: úsalo sin awaits de por medio (no toma el lock).
+        El filtro de HELLO aplica solo a (ex) vecinos; un nodo lejano sale del grafo cuando
+        vence su LSP (y las aristas que otros anuncian hacia él se siguen usando).
+        """
+        alive = self._alive_set(hello_timeout_sec, time.time()) if hello_timeout_sec is not None else None
+        return GraphView(self.adjacency, self.node_id, alive, scope=self.hello_scope)
 
+    def take_graph_changes(self) -> Optional[Set[str]]:
+        """
+        Nodos cuya adyacencia efectiva pudo cambiar desde la llamada anterior, o None si no
+        se puede saber (liveness sin seguimiento por eventos: hay que comparar todo).
+        """
+        dirty = self.adjacency.take_dirty()
+        return dirty if self._timers is not None else None
 
     async def build_graph(self, hello_timeout_sec: float | None = None) -> dict[str, dict[str, float]]:
+        """Copia {u: {v: w}} del grafo efectivo (ver graph_view)."""
         async with self._lock:
-            now = time.time()
-            graph: dict[str, dict[str, float]] = {}
-
-            # 1) Mis enlaces: opcionalmente filtrar por HELLO
+            view = self.graph_view(hello_timeout_sec)
+            graph = {u: dict(edges.items()) for u, edges in view.items()}
             graph.setdefault(self.node_id, {})
-            for n, info in self.neighbors.items():
-                if hello_timeout_sec is not None:
-                    if info.last_hello_ts == 0 or (now - info.last_hello_ts) > hello_timeout_sec:
-                        continue
-                graph[self.node_id][n] = info.cost
-                graph.setdefault(n, {}).setdefault(self.node_id, info.cost)
-
-            # 2) LSP de terceros: aceptarlos, pero opcionalmente
-            #    descartar aristas hacia nodos que nunca hemos visto vivos
-            def is_alive(node_id: str) -> bool:
-                ni = self.neighbors.get(node_id)
-                return bool(ni and ni.last_hello_ts and (now - ni.last_hello_ts) <= (hello_timeout_sec or 0))
-
-            for u, edges in self.lsdb.items():
-                graph.setdefault(u, {})
-                for v, w in edges.items():
-                    if hello_timeout_sec is not None and not is_alive(v) and v != self.node_id:
-                        # si no tenemos evidencia de vida de 'v', evita usarlo
-                        continue
-                    graph[u][v] = w
-                    graph.setdefault(v, {})
-                    graph[v].setdefault(u, w)
-
             return graph
 
-
     async def get_alive_links(self, hello_timeout_sec: float) -> dict[str, float]:
         now = time.time()
         async with self._lock:
-            out = {}
-            for n, info in self.neighbors.items():
-                if info.last_hello_ts and (now - info.last_hello_ts) <= hello_timeout_sec:
-                    out[n] = info.cost
-            return out
+            alive = self._alive_set(hello_timeout_sec, now)
+            return {n: info.cost for n, info in self.neighbors.items() if n in alive}
 
     # -----------------------------
-    # Tabla de ruteo (costos fijos en 1)
+    # Tabla de ruteo (snapshot copy-on-write, sin lock)
     # -----------------------------
-    async def set_routing_table(self, table: Dict[str, str]) -> None:
-        async with self._lock:
-            self.routing_table = dict(table)
+    @property
+    def routing_table(self) -> Mapping[str, str]:
+        """Vista de solo lectura de la tabla vigente (compat)."""
+        return self.routing.table
+
+    async def set_routing_table(self,
+                                table: Dict[str, str],
+                                multipath: Optional[Mapping[str, Tuple[str, ...]]] = None,
+                                alternates: Optional[Mapping[str, str]] = None,
+                                costs: Optional[Mapping[str, float]] = None) -> RoutingSnapshot:
+        """
+        Publica una tabla nueva. multipath: dst -> next hops de igual costo (ECMP);
+        alternates: dst -> next hop LFA; costs: dst -> costo total (del SPF);
+        'table' sigue siendo el next hop principal de cada destino.
+        """
+        # Se arma la tabla nueva aparte y se publica con una sola asignación:
+        # en asyncio no hay lectores a medio camino, así que no hace falta el lock.
+        hops = {d: tuple(h) for d, h in (multipath or {}).items() if len(h) > 1}
+        snap = RoutingSnapshot(self.routing.version + 1, MappingProxyType(dict(table)),
+                               MappingProxyType(hops), MappingProxyType(dict(alternates or {})),
+                               MappingProxyType({d: c for d, c in (costs or {}).items() if d in table}))
+        self.routing = snap
+        self._emit(ROUTES_CHANGED, str(snap.version))
+        return snap
+
+    def fail_over(self, neighbor_id: str) -> int:
+        """
+        Conmutación inmediata al caer un vecino, sin esperar el SPF: los destinos que salían
+        por él pasan a otro miembro ECMP o a su LFA; los que no tienen alternativa se quitan
+        (y el forwarding cae a flooding). El SPF posterior publica la tabla definitiva.
+        Devuelve cuántos destinos se desviaron.
+        """
+        cur = self.routing
+        table: Dict[str, str] = {}
+        hops: Dict[str, Tuple[str, ...]] = {}
+        moved = 0
+        for dst, nh in cur.table.items():
+            if dst == neighbor_id:
+                continue
+            ecmp = tuple(h for h in cur.hops.get(dst, ()) if h != neighbor_id)
+            if len(ecmp) > 1:
+                hops[dst] = ecmp
+            if nh != neighbor_id:
+                table[dst] = nh
+                continue
+            alt = ecmp[0] if ecmp else cur.alternates.get(dst)
+            if alt and alt != neighbor_id:
+                table[dst] = alt
+                moved += 1
+        alternates = {d: a for d, a in cur.alternates.items()
+                      if a != neighbor_id and d in table and table[d] != a}
+        # el costo por la alternativa no se conoce hasta el SPF (los desviados quedan sin costo)
+        costs = {d: c for d, c in cur.costs.items() if d in table and table[d] == cur.table.get(d)}
+        self.routing = RoutingSnapshot(cur.version + 1, MappingProxyType(table),
+                                       MappingProxyType(hops), MappingProxyType(alternates),
+                                       MappingProxyType(costs))
+        self._emit(ROUTES_CHANGED, str(self.routing.version))
+        return moved
+
+    def next_hop(self, dst: str, flow: Optional[Tuple[Any, ...]] = None) -> Optional[str]:
+        """
+        Lookup del plano de datos: lee el snapshot vigente, sin await ni lock.
+        flow (p. ej. (from, to, trace_id)): reparte entre los next hops ECMP de forma estable.
+        """
+        return self.routing.next_hop(dst, flow)
+
+    def next_hops(self, dst: str) -> Tuple[str, ...]:
+        return self.routing.next_hops(dst)
 
     async def get_next_hop(self, dst: str) -> Optional[str]:
-        async with self._lock:
-            return self.routing_table.get(dst)
+        return self.next_hop(dst)
 
     async def get_routing_snapshot(self) -> Dict[str, str]:
-        async with self._lock:
-            return dict(self.routing_table)
+        return dict(self.routing.table)
 
     async def get_routing_table(self) -> Dict[str, Dict[str, float]]:
         """
         Devuelve {dst: {"next_hop": <id|->, "cost": <float|inf>}}
-        Usando:
-        - routing_table (next-hop ya calculado por LSR)
-        - LSDB -> grafo -> Dijkstra para costos reales
+        Usando el snapshot vigente: next hops (varios si hay ECMP) y el costo que dejó el SPF
+        del LSR (inf si no se conoce, p. ej. tabla restaurada o recién desviada por fail_over()).
         """
-        # snapshot de lo que ya tienes
-        routing = await self.get_routing_snapshot()
-        graph   = await self.build_graph()
-
-        # asegura que exista mi nodo en el grafo
-        if self.node_id not in graph:
-            graph[self.node_id] = {}
-
-        # Dijkstra local (distancias mínimas desde self.node_id)
         import math
-        dist = {n: math.inf for n in graph.keys()}
-        vis  = {n: False     for n in graph.keys()}
-        dist[self.node_id] = 0.0
-
-        for _ in range(len(graph)):
-            u, best = None, math.inf
-            for n in graph.keys():
-                if not vis[n] and dist[n] < best:
-                    u, best = n, dist[n]
-            if u is None:
-                break
-            vis[u] = True
-            for v, w in graph[u].items():
-                if vis.get(v): 
-                    continue
-                alt = dist[u] + float(w)
-                if alt < dist[v]:
-                    dist[v] = alt
-
-        # arma tabla con next-hop (de routing_table) y costo (de dist)
+        snap = self.routing
         out: Dict[str, Dict[str, float]] = {}
-        for dst in sorted(routing.keys()):
+        for dst in sorted(snap.table):
             if dst == self.node_id:
                 continue
-            nh = routing.get(dst)
-            c  = dist.get(dst, math.inf)
-            out[dst] = {"next_hop": nh or "-", "cost": c}
+            nh = ",".join(snap.next_hops(dst))
+            out[dst] = {"next_hop": nh or "-", "cost": snap.costs.get(dst, math.inf)}
         return out
 
     async def print_routing_table(self) -> None:
         """
         Imprime la tabla de ruteo bonita: destino, next-hop y costo total.
-        Recalcula costos en el momento usando la LSDB.
         """
         table = await self.get_routing_table()
         print(f"\n== Tabla de ruteo de {self.node_id} ==")
@@ -243,6 +550,70 @@ class State:
                 print(f"{dst:<10} {nh:<10} {cost_str:>10}")
         print("-" * 34)
 
+    # -----------------------------
+    # Snapshot (warm start)
+    # -----------------------------
+    async def export_snapshot(self) -> Dict[str, Any]:
+        """Copia serializable de LSDB (+ts/seq), tabla de ruteo y costos de vecinos."""
+        async with self._lock:
+            return {
+                "node_id": self.node_id,
+                "saved_at": time.time(),
+                "lsdb": dict(self.lsdb.items()),
+                "lsdb_ts": dict(self.lsdb_ts),
+                "lsdb_seq": dict(self.lsdb_seq),
+                "routing_table": dict(self.routing.table),
+                "multipath": {d: list(h) for d, h in self.routing.hops.items()},
+                "costs": dict(self.routing.costs),
+                "neighbors": {n: info.cost for n, info in self.neighbors.items()},
+            }
+
+    async def restore_snapshot(self, data: Dict[str, Any], max_age_sec: float) -> int:
+        """
+        Integra un snapshot de export_snapshot() al arrancar (antes de recibir INFO).
+        - se ignora completo si es de otro nodo o más viejo que max_age_sec
+        - LSPs de terceros: solo las que no habrían expirado (edad <= max_age_sec)
+        - costos: solo para vecinos que siguen en la topología configurada
+        - tabla de ruteo: se publica tal cual para reenviar de inmediato; el primer SPF la corrige
+        Devuelve cuántas LSPs se restauraron.
+        """
+        if data.get("node_id") != self.node_id:
+            return 0
+        now = time.time()
+        if now - float(data.get("saved_at", 0.0)) > max_age_sec:
+            return 0
+
+        restored = 0
+        async with self._lock:
+            for n, cost in (data.get("neighbors") or {}).items():
+                if n in self.neighbors:
+                    self.neighbors[n].cost = float(cost)
+                    self.adjacency.set_link(self.node_id, n, float(cost))
+
+            lsdb_ts = data.get("lsdb_ts") or {}
+            lsdb_seq = data.get("lsdb_seq") or {}
+            for origin, links in (data.get("lsdb") or {}).items():
+                ts = lsdb_ts.get(origin)
+                if origin == self.node_id or ts is None or now - float(ts) > max_age_sec:
+                    continue
+                if origin in self.lsdb_ts:  # ya hay algo más nuevo
+                    continue
+                self.adjacency.set_links(origin, links)
+                self.lsdb_ts[origin] = float(ts)
+                if origin in lsdb_seq:
+                    self.lsdb_seq[origin] = int(lsdb_seq[origin])
+                if self._timers is not None and self.lsp_max_age_sec is not None:
+                    self._timers.arm((LSP_EXPIRED, origin), self.lsp_max_age_sec - (now - float(ts)))
+                restored += 1
+
+        table = data.get("routing_table") or {}
+        if table and not self.routing.table:
+            multipath = {d: tuple(h for h in hops if h in self.neighbors)
+                         for d, hops in (data.get("multipath") or {}).items()}
+            await self.set_routing_table({d: nh for d, nh in table.items() if nh in self.neighbors}, multipath,
+                                         costs=data.get("costs"))
+        return restored
+
     # -----------------------------
     # seen_cache
     # -----------------------------
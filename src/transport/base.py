@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from src.protocol import codec as wire
+
+# payload ya serializado: str (JSON) o bytes (binario)
+Wire = Union[str, bytes]
+# grupo de broadcast: payload serializado una vez + [(canal lógico, canal físico)]
+Group = Tuple[Wire, List[Tuple[str, str]]]
+
+
+# Carril de control: HELLO/INFO van antes que los MESSAGE de usuario
+CONTROL_TYPES = frozenset({"hello", "info"})
+CONTROL_SUFFIX = ".ctrl"   # canal dedicado de control: <canal>.ctrl
+
+
+def is_control(message: Any) -> bool:
+    """True si es un paquete de control (dict ya armado o payload crudo)."""
+    if isinstance(message, dict):
+        return message.get("type") in CONTROL_TYPES
+    return wire.peek_type(message) in CONTROL_TYPES
+
+
+class PriorityInbox:
+    """
+    Buzón de recepción con dos carriles (control / datos), drop-in de asyncio.Queue para
+    productores (put_nowait, None = cierre):
+    - put_nowait() clasifica por tipo sin decodificar (codec.peek_type)
+    - control_lane: escritor que manda todo a control (canal dedicado <canal>.ctrl)
+    - batches(): control siempre sale primero; si hay datos esperando, se les reserva
+      data_share del lote (reparto ponderado: una tormenta de control no los deja sin servicio)
+    - data_maxsize > 0: put() (async) espera lugar en el carril de datos → backpressure al lector;
+      put_nowait() no puede esperar: con el carril lleno descarta el dato, lo cuenta en 'dropped'
+      y devuelve False (productores compartidos: hub, bus loopback). Control nunca se descarta.
+    """
+
+    def __init__(self, data_share: float = 0.25, data_maxsize: int = 0) -> None:
+        self.data_share = data_share
+        self.data_maxsize = data_maxsize
+        self._ctrl: Deque[Wire] = deque()
+        self._data: Deque[Wire] = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._closed = False
+        self.dropped = 0  # datos descartados por put_nowait() con el carril lleno
+        self.control_lane = _LaneWriter(self, control=True)
+
+    def __len__(self) -> int:
+        return len(self._ctrl) + len(self._data)
+
+    def put_nowait(self, item: Optional[Wire], control: Optional[bool] = None) -> bool:
+        if item is None:
+            self.close()
+            return True
+        if control is None:
+            control = is_control(item)
+        if not control and self.data_maxsize and len(self._data) >= self.data_maxsize:
+            self.dropped += 1
+            return False
+        (self._ctrl if control else self._data).append(item)
+        if self.data_maxsize and len(self._data) >= self.data_maxsize:
+            self._space.clear()
+        self._ready.set()
+        return True
+
+    async def put(self, item: Wire, control: Optional[bool] = None) -> None:
+        if control is None:
+            control = is_control(item)
+        while not control and self.data_maxsize and len(self._data) >= self.data_maxsize and not self._closed:
+            self._space.clear()
+            await self._space.wait()
+        self.put_nowait(item, control)
+
+    def close(self) -> None:
+        self._closed = True
+        self._ready.set()
+        self._space.set()
+
+    async def batches(self, max_batch: int = 64, max_wait: float = 0.0) -> AsyncIterator[List[Wire]]:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._ctrl and not self._data:
+                if self._closed:
+                    return
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            if max_wait > 0 and len(self) < max_batch:
+                deadline = loop.time() + max_wait
+                while len(self) < max_batch and not self._closed:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    self._ready.clear()
+                    try:
+                        await asyncio.wait_for(self._ready.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+            yield self._take(max_batch)
+
+    def _take(self, max_batch: int) -> List[Wire]:
+        reserved = min(len(self._data), math.ceil(self.data_share * max_batch)) if self._data else 0
+        n_ctrl = min(len(self._ctrl), max_batch - reserved)
+        batch = [self._ctrl.popleft() for _ in range(n_ctrl)]
+        n_data = min(len(self._data), max_batch - n_ctrl)
+        batch.extend(self._data.popleft() for _ in range(n_data))
+        if not self.data_maxsize or len(self._data) < self.data_maxsize:
+            self._space.set()
+        return batch
+
+
+class _LaneWriter:
+    """Productor que escribe siempre en un carril fijo (para suscribirlo a un canal)."""
+    __slots__ = ("_inbox", "_control")
+
+    def __init__(self, inbox: PriorityInbox, control: bool) -> None:
+        self._inbox = inbox
+        self._control = control
+
+    def put_nowait(self, item: Optional[Wire]) -> bool:
+        return self._inbox.put_nowait(item, self._control)
+
+    async def put(self, item: Wire) -> None:
+        await self._inbox.put(item, self._control)
+
+
+class Transport(ABC):
+    """
+    Interfaz común de transporte Pub/Sub usada por Node, ForwardingService y RoutingLSRService.
+    - connect()/close()
+    - publish(canal, msg) → suscriptores que lo recibieron
+    - broadcast(canales, msg) → {canal: suscriptores}
+    - read_batches()/read_loop(): iteradores async de payloads crudos del canal propio
+
+    Implementaciones: RedisTransport (red) y LoopbackTransport (en memoria, mismo proceso).
+
+    Codec de cable: JSON por defecto. Si el nodo soporta binario (codec=BINARY), se usa
+    solo hacia los canales negociados con set_channel_codec (vía HELLO); el resto sigue en JSON.
+    """
+
+    my_channel: str
+
+    def __init__(self, codec: str = wire.JSON) -> None:
+        if codec not in wire.CODECS:
+            raise ValueError(f"codec desconocido: {codec}")
+        self.codec = codec                           # codec preferido por este nodo
+        self._channel_codecs: Dict[str, str] = {}    # canal vecino -> codec negociado
+        self.control_channel = False                 # ¿escucho también en <canal>.ctrl?
+        self._ctrl_peers: Set[str] = set()           # canales vecinos con carril .ctrl (vía HELLO)
+
+    # ------------- lifecycle -------------
+
+    @abstractmethod
+    async def connect(self) -> None:
+        ...
+
+    @abstractmethod
+    async def close(self) -> None:
+        ...
+
+    # ------------- publish -------------
+
+    def set_channel_codec(self, channel: str, codec: str) -> None:
+        """Fija el codec a usar hacia un canal (solo BINARY si este nodo también lo soporta)."""
+        if codec == wire.BINARY and self.codec == wire.BINARY:
+            self._channel_codecs[channel] = wire.BINARY
+        else:
+            self._channel_codecs.pop(channel, None)
+
+    def codec_for(self, channel: str) -> str:
+        return self._channel_codecs.get(channel, wire.JSON)
+
+    def set_channel_control(self, channel: str, enabled: bool) -> None:
+        """El vecino de 'channel' escucha control en <channel>.ctrl (anunciado en su HELLO)."""
+        if enabled:
+            self._ctrl_peers.add(channel)
+        else:
+            self._ctrl_peers.discard(channel)
+
+    def _target(self, channel: str, message: str | Dict[str, Any]) -> str:
+        """Canal físico: los paquetes de control van al .ctrl del vecino si lo anunció."""
+        if channel in self._ctrl_peers and is_control(message):
+            return channel + CONTROL_SUFFIX
+        return channel
+
+    def _encode(self, message: str | Dict[str, Any], channel: Optional[str] = None) -> Wire:
+        """Serializa un dict con el codec negociado para 'channel'; un str se publica tal cual."""
+        return wire.encode(message, self.codec_for(channel) if channel else wire.JSON)
+
+    def _encode_groups(self, channels: List[str], message: str | Dict[str, Any]) -> List[Group]:
+        """
+        Agrupa canales por codec y serializa una sola vez por grupo: [(payload, [(lógico, físico)])].
+        Se publica en el físico (.ctrl para control si el vecino lo anunció); el resultado de
+        broadcast() va por el lógico, igual en todos los backends.
+        """
+        groups: Dict[str, List[Tuple[str, str]]] = {}
+        for ch in channels:
+            groups.setdefault(self.codec_for(ch), []).append((ch, self._target(ch, message)))
+        return [(wire.encode(message, c), chs) for c, chs in groups.items()]
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str | Dict[str, Any]) -> int:
+        ...
+
+    async def publish_json(self, channel: str, payload: Dict[str, Any]) -> int:
+        return await self.publish(channel, payload)
+
+    async def broadcast(self, neighbor_channels: Iterable[str], message: str | Dict[str, Any]) -> Dict[str, int]:
+        """
+        Publica el mismo mensaje a múltiples canales. Implementación genérica (un publish
+        por canal); los backends la sobreescriben si tienen un camino más barato.
+        """
+        channels = list(dict.fromkeys(neighbor_channels))
+        counts = await asyncio.gather(*(self.publish(ch, message) for ch in channels))
+        return dict(zip(channels, counts))
+
+    # ------------- receive -------------
+
+    @abstractmethod
+    def read_batches(self, max_batch: int = 64, max_wait: float = 0.0) -> AsyncIterator[List[Wire]]:
+        ...
+
+    async def read_loop(self, max_batch: int = 64) -> AsyncIterator[Wire]:
+        """
+        Iterador async que entrega payloads crudos (str JSON o bytes) recibidos en el canal propio.
+        Se apoya en read_batches y aplana los lotes.
+        """
+        async for batch in self.read_batches(max_batch=max_batch):
+            for data in batch:
+                yield data
+
+    # ------------- helpers -------------
+
+    @staticmethod
+    def channel_name(section: str, topo: str, node: str) -> str:
+        """
+        Helper para mantener el patrón SECTION.TOPO.NODE
+        """
+        return f"{section}.{topo}.{node}"
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import astuple
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+import redis.asyncio as redis
+
+from src.transport.base import CONTROL_SUFFIX, Group, PriorityInbox, Transport, Wire
+from src.transport.redis_transport import (
+    RedisSettings,
+    LUA_BROADCAST,
+    make_client,
+    publish_many,
+    pubsub_batches,
+)
+from src.utils.log import setup_logger
+
+
+class TransportHub:
+    """
+    Multiplexa muchos nodos del mismo proceso sobre Redis:
+    - Un cliente Redis (pool) compartido para todos los PUBLISH
+    - Una sola conexión PubSub suscrita a los canales de todos los nodos
+      (o a un patrón, p. ej. "sec20.topologia1.*", con PSUBSCRIBE)
+    - Un único bucle de recepción que enruta cada mensaje a la cola del nodo dueño del canal
+
+    Uso típico:
+        hub = TransportHub(settings, pattern="sec20.topologia1.*")
+        node = Node(node_id="A", transport_factory=hub.attach)
+    """
+
+    _shared: Dict[tuple, "TransportHub"] = {}
+
+    def __init__(self, settings: RedisSettings, pattern: Optional[str] = None, logger_name: str = "hub") -> None:
+        self.settings = settings
+        self.pattern = pattern
+        self._client: Optional[redis.Redis] = None
+        self._pubsub: Optional[redis.client.PubSub] = None
+        self._broadcast_script = None
+        self._queues: Dict[str, Any] = {}  # canal -> buzón del nodo (put_nowait)
+        self._dispatch_task: Optional[asyncio.Task] = None
+        self._connect_lock = asyncio.Lock()
+        self._closed = False
+        self.unrouted = 0  # mensajes sin nodo local (p. ej. por el patrón)
+        self.dropped = 0   # datos descartados por carril de datos lleno en el nodo destino
+        self.log = setup_logger(logger_name)
+
+    @classmethod
+    def shared(cls, settings: RedisSettings, pattern: Optional[str] = None) -> "TransportHub":
+        """
+        Hub compartido del proceso por (settings, pattern). Entran todos los campos de
+        RedisSettings (codec, password, broadcast_mode, carriles...): dos llamadores con
+        configuración distinta no comparten un hub armado para el primero.
+        """
+        key = (astuple(settings), pattern)
+        hub = cls._shared.get(key)
+        if hub is None or hub._closed:
+            hub = cls._shared[key] = cls(settings, pattern=pattern)
+        return hub
+
+    def attach(self, channel: str, logger_name: Optional[str] = None) -> "HubTransport":
+        """Crea el Transport de un nodo (firma compatible con Node.transport_factory)."""
+        return HubTransport(self, channel, logger_name=logger_name or channel)
+
+    # ------------- lifecycle -------------
+
+    async def connect(self) -> None:
+        async with self._connect_lock:
+            if self._client:
+                return
+            self._client = make_client(self.settings)
+            if not await self._client.ping():
+                raise RuntimeError("Redis PING failed")
+            self._broadcast_script = self._client.register_script(LUA_BROADCAST)
+            self._pubsub = self._client.pubsub()
+            if self.pattern:
+                await self._pubsub.psubscribe(self.pattern)
+                self._start_dispatch()
+            self.log.info(f"Hub conectado a Redis {self.settings.host}:{self.settings.port} "
+                          f"(patrón={self.pattern or '-'})")
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._dispatch_task:
+            self._dispatch_task.cancel()
+            try:
+                await self._dispatch_task
+            except asyncio.CancelledError:
+                pass
+        for q in self._queues.values():
+            q.put_nowait(None)  # despierta a los lectores
+        self._queues.clear()
+        try:
+            if self._pubsub:
+                await self._pubsub.close()
+        finally:
+            if self._client:
+                await self._client.close()
+        self.log.info("Hub Redis cerrado")
+
+    # ------------- registro de nodos -------------
+
+    async def _register(self, channel: str, queue: Any) -> None:
+        await self.connect()
+        self._queues[channel] = queue
+        if not self.pattern:
+            await self._pubsub.subscribe(channel)
+            self._start_dispatch()
+
+    async def _unregister(self, channel: str) -> None:
+        q = self._queues.pop(channel, None)
+        if q is not None:
+            q.put_nowait(None)
+        if not self.pattern and self._pubsub and not self._closed:
+            await self._pubsub.unsubscribe(channel)
+        # el último nodo en salir cierra las conexiones compartidas
+        if not self._queues:
+            await self.close()
+
+    def _start_dispatch(self) -> None:
+        if self._dispatch_task is None or self._dispatch_task.done():
+            self._dispatch_task = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        """Bucle único de recepción: enruta por canal a la cola de cada nodo."""
+        idle_timeout = max(self.settings.health_check_interval, 1.0)
+        async for msgs in pubsub_batches(self._pubsub, lambda: self._closed, self.log, idle_timeout, max_batch=256):
+            for m in msgs:
+                data = m.get("data")
+                if data is None:
+                    continue
+                ch = m.get("channel")
+                if isinstance(ch, bytes):  # decode_responses=False (codec binario)
+                    ch = ch.decode("utf-8")
+                q = self._queues.get(ch)
+                if q is None:
+                    self.unrouted += 1
+                    continue
+                # un solo lector para todos los nodos: no se espera a uno lento, se descarta
+                # su dato excedente (data_queue_depth) en vez de crecer sin límite
+                if not q.put_nowait(data):
+                    self.dropped += 1
+
+    # ------------- publish -------------
+
+    async def publish(self, channel: str, payload: Wire) -> int:
+        if not self._client:
+            raise RuntimeError("Hub no conectado")
+        return await self._client.publish(channel, payload)
+
+    async def broadcast(self, groups: List[Group]) -> Dict[str, int]:
+        """groups: [(payload serializado, [(canal lógico, físico)])], todo en un round trip."""
+        if not self._client:
+            raise RuntimeError("Hub no conectado")
+        return await publish_many(self._client, groups, self.settings.broadcast_mode, self._broadcast_script)
+
+
+class HubTransport(Transport):
+    """
+    Transport de un nodo sobre un TransportHub compartido (sin sockets propios).
+    """
+
+    def __init__(self, hub: TransportHub, my_channel: str, logger_name: str = "transport") -> None:
+        super().__init__(hub.settings.codec)
+        self.hub = hub
+        self.my_channel = my_channel
+        self.control_channel = hub.settings.control_channel
+        self._queue: Optional[PriorityInbox] = None
+        self._closed = False
+        self.log = setup_logger(logger_name)
+
+    # ------------- lifecycle -------------
+
+    async def connect(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = PriorityInbox(self.hub.settings.data_share, self.hub.settings.data_queue_depth)
+        await self.hub._register(self.my_channel, self._queue)
+        if self.control_channel:
+            await self.hub._register(self.my_channel + CONTROL_SUFFIX, self._queue.control_lane)
+        self.log.info(f"Suscrito a canal propio (hub): {self.my_channel}")
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self.control_channel:
+            await self.hub._unregister(self.my_channel + CONTROL_SUFFIX)
+        await self.hub._unregister(self.my_channel)
+        self.log.info("Transporte hub cerrado")
+
+    # ------------- publish -------------
+
+    async def publish(self, channel: str, message: str | Dict[str, Any]) -> int:
+        payload = self._encode(message, channel)
+        target = self._target(channel, message)
+        subscribers = await self.hub.publish(target, payload)
+        self.log.debug(f"PUBLISH → {target} ({subscribers} subs): {payload}")
+        return subscribers
+
+    async def broadcast(self, neighbor_channels: Iterable[str], message: str | Dict[str, Any]) -> Dict[str, int]:
+        channels = list(dict.fromkeys(neighbor_channels))
+        if not channels:
+            return {}
+        return await self.hub.broadcast(self._encode_groups(channels, message))
+
+    # ------------- receive -------------
+
+    async def read_batches(self, max_batch: int = 64, max_wait: float = 0.0) -> AsyncIterator[List[Wire]]:
+        if self._queue is None:
+            raise RuntimeError("Transport no conectado")
+        async for batch in self._queue.batches(max_batch, max_wait):
+            yield batch
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from src.protocol import codec as wire
+from src.transport.base import CONTROL_SUFFIX, PriorityInbox, Transport, Wire
+from src.utils.log import setup_logger
+
+
+class LoopbackBus:
+    """
+    Bus Pub/Sub en memoria: canal -> colas suscritas.
+    Misma semántica que Redis Pub/Sub (fire-and-forget, publish devuelve nº de suscriptores),
+    pero sin red: permite correr topologías completas en un solo proceso.
+    """
+
+    _default: Optional["LoopbackBus"] = None
+
+    def __init__(self) -> None:
+        self._subs: Dict[str, List[asyncio.Queue]] = {}
+
+    @classmethod
+    def default(cls) -> "LoopbackBus":
+        """Bus compartido del proceso (el que usan los nodos con TRANSPORT=loopback)."""
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def subscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        self._subs.setdefault(channel, []).append(queue)
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        queues = self._subs.get(channel, [])
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self._subs.pop(channel, None)
+
+    def publish(self, channel: str, payload: Wire) -> int:
+        queues = self._subs.get(channel, [])
+        for q in queues:
+            q.put_nowait(payload)
+        return len(queues)
+
+
+class LoopbackTransport(Transport):
+    """
+    Transporte en memoria sobre un LoopbackBus (colas asyncio por canal).
+    Los payloads se serializan igual que en Redis para que el resto del nodo no note la diferencia.
+    Recepción con carriles de prioridad (PriorityInbox); control_channel=True escucha además
+    en <canal>.ctrl, que los vecinos usan para HELLO/INFO una vez anunciado en el HELLO.
+
+    Uso típico:
+        bus = LoopbackBus()
+        t = LoopbackTransport("sec10.topo1.A", bus=bus, logger_name="A")
+        await t.connect()
+    """
+
+    def __init__(self,
+                 my_channel: str,
+                 bus: Optional[LoopbackBus] = None,
+                 logger_name: str = "transport",
+                 codec: str = wire.JSON,
+                 control_channel: bool = False,
+                 data_queue_depth: int = 1024) -> None:
+        super().__init__(codec)
+        self.my_channel = my_channel
+        self.control_channel = control_channel
+        self.data_queue_depth = data_queue_depth  # mismo tope que RedisSettings (excedente: se descarta)
+        self.bus = bus or LoopbackBus.default()
+        self._queue: Optional[PriorityInbox] = None
+        self._closed = False
+        self.log = setup_logger(logger_name)
+
+    # ------------- lifecycle -------------
+
+    async def connect(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = PriorityInbox(data_maxsize=self.data_queue_depth)
+        self.bus.subscribe(self.my_channel, self._queue)
+        if self.control_channel:
+            self.bus.subscribe(self.my_channel + CONTROL_SUFFIX, self._queue.control_lane)
+        self.log.info(f"Suscrito a canal propio (loopback): {self.my_channel}")
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._queue is not None:
+            self.bus.unsubscribe(self.my_channel, self._queue)
+            if self.control_channel:
+                self.bus.unsubscribe(self.my_channel + CONTROL_SUFFIX, self._queue.control_lane)
+            self._queue.close()  # despierta al lector
+        self.log.info("Transporte loopback cerrado")
+
+    # ------------- publish -------------
+
+    async def publish(self, channel: str, message: str | Dict[str, Any]) -> int:
+        if self._queue is None:
+            raise RuntimeError("Transport no conectado")
+        payload = self._encode(message, channel)
+        target = self._target(channel, message)
+        subscribers = self.bus.publish(target, payload)
+        self.log.debug(f"PUBLISH → {target} ({subscribers} subs): {payload}")
+        return subscribers
+
+    async def broadcast(self, neighbor_channels, message: str | Dict[str, Any]) -> Dict[str, int]:
+        if self._queue is None:
+            raise RuntimeError("Transport no conectado")
+        out: Dict[str, int] = {}
+        for payload, chs in self._encode_groups(list(dict.fromkeys(neighbor_channels)), message):
+            for ch, target in chs:  # una sola serialización por codec
+                out[ch] = self.bus.publish(target, payload)
+        return out
+
+    # ------------- receive -------------
+
+    async def read_batches(self, max_batch: int = 64, max_wait: float = 0.0) -> AsyncIterator[List[Wire]]:
+        if self._queue is None:
+            raise RuntimeError("Transport no conectado")
+
+        async for batch in self._queue.batches(max_batch, max_wait):
+            yield batch
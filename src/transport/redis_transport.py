@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 import asyncio
-import json
 from dataclasses import dataclass
-from typing import Any, AsyncIterator, Dict, Iterable, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
 
 import redis.asyncio as redis
 
+from src.protocol import codec as wire
+from src.transport.base import CONTROL_SUFFIX, Group, PriorityInbox, Transport, Wire
 from src.utils.log import setup_logger
 
 
@@ -16,19 +17,116 @@ class RedisSettings:
     port: int = 6379
     password: Optional[str] = None
     db: int = 0
-    decode_responses: bool = True  # publicar/leer como str (JSON)
+    decode_responses: bool = True  # publicar/leer como str (JSON); se fuerza a False con codec binario
+    codec: str = "json"            # codec preferido: "json" o "binary" (negociado por vecino)
     # timeouts
     socket_timeout: float = 10.0
     health_check_interval: float = 15.0
+    # fan-out de broadcast: "pipeline" (1 round trip), "multi" (MULTI/EXEC) o "lua" (script)
+    broadcast_mode: str = "pipeline"
+    # carriles de prioridad en recepción: control (HELLO/INFO) primero, datos con reparto ponderado
+    control_channel: bool = False   # suscribir además <canal>.ctrl en una conexión PubSub propia
+    data_queue_depth: int = 1024    # datos en espera antes de dejar de leer del socket (backpressure)
+    data_share: float = 0.25        # fracción mínima de cada lote para datos si hay control en cola
 
 
-class RedisTransport:
+# PUBLISH del mismo payload (ARGV[1]) a cada canal (ARGV[2..n]); devuelve subs por canal
+LUA_BROADCAST = """
+local out = {}
+for i = 2, #ARGV do
+    out[i - 1] = redis.call('PUBLISH', ARGV[i], ARGV[1])
+end
+return out
+"""
+
+
+def make_client(settings: RedisSettings) -> redis.Redis:
+    """Cliente Redis (con su pool de conexiones) según settings."""
+    return redis.Redis(
+        host=settings.host,
+        port=settings.port,
+        password=settings.password,
+        db=settings.db,
+        # el codec binario necesita bytes crudos (JSON se sigue leyendo igual desde bytes)
+        decode_responses=settings.decode_responses and settings.codec != wire.BINARY,
+        socket_timeout=settings.socket_timeout,
+        health_check_interval=settings.health_check_interval,
+    )
+
+
+async def publish_many(client: redis.Redis,
+                       groups: List[Group],
+                       mode: str,
+                       script=None) -> Dict[str, int]:
+    """
+    PUBLISH a varios canales en un solo round trip.
+    groups: [(payload ya serializado, [(canal lógico, canal físico)])] (un grupo por codec).
+    mode: "pipeline", "multi" (MULTI/EXEC) o "lua" (requiere script registrado).
+    Devuelve {canal lógico: suscriptores} (se publica en el físico, p. ej. <canal>.ctrl).
+    """
+    pairs = [(ch, target, payload) for payload, chs in groups for ch, target in chs]
+    if len(pairs) == 1:
+        ch, target, payload = pairs[0]
+        return {ch: int(await client.publish(target, payload))}
+    if mode == "lua" and script is not None:
+        out: Dict[str, int] = {}
+        for payload, chs in groups:
+            counts = await script(keys=[], args=[payload, *(target for _, target in chs)])
+            out.update(zip((ch for ch, _ in chs), map(int, counts)))
+        return out
+    async with client.pipeline(transaction=(mode == "multi")) as pipe:
+        for _, target, payload in pairs:
+            pipe.publish(target, payload)
+        counts = await pipe.execute()
+    return {ch: int(n) for (ch, _, _), n in zip(pairs, counts)}
+
+
+async def pubsub_batches(pubsub: redis.client.PubSub,
+                         is_closed,
+                         log,
+                         idle_timeout: float,
+                         max_batch: int = 64,
+                         max_wait: float = 0.0) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Lotes de mensajes PubSub ('message'/'pmessage') orientado a eventos:
+    bloquea en el socket hasta idle_timeout y luego drena lo que haya en buffer.
+    is_closed: fn() -> bool para cortar el bucle.
+    """
+    loop = asyncio.get_running_loop()
+    while not is_closed():
+        try:
+            msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=idle_timeout)
+            if msg is None:
+                continue
+            batch: List[Dict[str, Any]] = [msg]
+
+            # drenar lo que ya llegó (timeout=0 no cede el loop si hay datos en buffer)
+            deadline = loop.time() + max_wait
+            while len(batch) < max_batch:
+                remaining = max(0.0, deadline - loop.time())
+                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if msg is None:
+                    break
+                batch.append(msg)
+
+            yield batch
+        except asyncio.CancelledError:
+            break
+        except Exception as exc:
+            log.error(f"Error leyendo PubSub: {exc}")
+            await asyncio.sleep(0.2)
+
+
+class RedisTransport(Transport):
     """
     Capa de transporte Pub/Sub sobre Redis.
     - Conecta a Redis
     - Se suscribe al canal del nodo (my_channel)
     - Publica a canales (unicast) o a varios (broadcast)
     - Entrega un iterador async de mensajes entrantes (JSON o str)
+    - Recepción por carriles: lectores de fondo vuelcan a un PriorityInbox (control primero);
+      con control_channel=True el control llega por <canal>.ctrl en otra conexión, así un
+      socket saturado de MESSAGE no retrasa HELLO/INFO
 
     Uso típico:
         t = RedisTransport(settings, my_channel="sec10.topo1.A", logger_name="A")
@@ -38,10 +136,16 @@ class RedisTransport:
     """
 
     def __init__(self, settings: RedisSettings, my_channel: str, logger_name: str = "transport") -> None:
+        super().__init__(settings.codec)
         self.settings = settings
         self.my_channel = my_channel
         self._client: Optional[redis.Redis] = None
         self._pubsub: Optional[redis.client.PubSub] = None
+        self._ctrl_pubsub: Optional[redis.client.PubSub] = None
+        self._broadcast_script = None  # se registra al conectar
+        self.control_channel = settings.control_channel
+        self._inbox = PriorityInbox(settings.data_share, settings.data_queue_depth)
+        self._pumps: List[asyncio.Task] = []
         self._closed = False
         self.log = setup_logger(logger_name)
 
@@ -51,32 +155,38 @@ class RedisTransport:
         if self._client:
             return
 
-        self._client = redis.Redis(
-            host=self.settings.host,
-            port=self.settings.port,
-            password=self.settings.password,
-            db=self.settings.db,
-            decode_responses=self.settings.decode_responses,
-            socket_timeout=self.settings.socket_timeout,
-            health_check_interval=self.settings.health_check_interval,
-        )
+        self._client = make_client(self.settings)
 
         # Verifica conexión
         pong = await self._client.ping()
         if not pong:
             raise RuntimeError("Redis PING failed")
         self.log.info(f"Conectado a Redis {self.settings.host}:{self.settings.port}")
+        self._broadcast_script = self._client.register_script(LUA_BROADCAST)
 
         # PubSub y suscripción a mi canal
         self._pubsub = self._client.pubsub()
         await self._pubsub.subscribe(self.my_channel)
         self.log.info(f"Suscrito a canal propio: {self.my_channel}")
+        if self.control_channel:
+            self._ctrl_pubsub = self._client.pubsub()
+            await self._ctrl_pubsub.subscribe(self.my_channel + CONTROL_SUFFIX)
+            self.log.info(f"Suscrito a canal de control: {self.my_channel + CONTROL_SUFFIX}")
 
     async def close(self) -> None:
         if self._closed:
             return
         self._closed = True
+        for task in self._pumps:
+            task.cancel()
+        # esperar a que suelten la conexión antes de usarla para el unsubscribe
+        await asyncio.gather(*self._pumps, return_exceptions=True)
+        self._pumps = []
+        self._inbox.close()
         try:
+            if self._ctrl_pubsub:
+                await self._ctrl_pubsub.unsubscribe(self.my_channel + CONTROL_SUFFIX)
+                await self._ctrl_pubsub.close()
             if self._pubsub:
                 await self._pubsub.unsubscribe(self.my_channel)
                 await self._pubsub.close()
@@ -89,63 +199,67 @@ class RedisTransport:
 
     async def publish(self, channel: str, message: str | Dict[str, Any]) -> int:
         """
-        Publica un mensaje (str o dict). Si es dict, se serializa a JSON.
+        Publica un mensaje (str o dict). Si es dict, se serializa con el codec del canal.
         Devuelve cantidad de suscriptores a los que se entregó.
         """
         if not self._client:
             raise RuntimeError("Transport no conectado")
-        if isinstance(message, dict):
-            payload = json.dumps(message, ensure_ascii=False)
-        else:
-            payload = message
-        subscribers = await self._client.publish(channel, payload)
-        self.log.debug(f"PUBLISH → {channel} ({subscribers} subs): {payload}")
+        payload = self._encode(message, channel)
+        target = self._target(channel, message)
+        subscribers = await self._client.publish(target, payload)
+        self.log.debug(f"PUBLISH → {target} ({subscribers} subs): {payload}")
         return subscribers
 
-    async def publish_json(self, channel: str, payload: Dict[str, Any]) -> int:
-        return await self.publish(channel, payload)
-
-    async def broadcast(self, neighbor_channels: Iterable[str], message: str | Dict[str, Any]) -> None:
+    async def broadcast(self,
+                        neighbor_channels: Iterable[str],
+                        message: str | Dict[str, Any],
+                        mode: Optional[str] = None) -> Dict[str, int]:
         """
-        Publica el mismo mensaje a múltiples canales (vecinos).
-        No espera a que cada publish termine secuencialmente, sino en paralelo.
+        Publica el mismo mensaje a múltiples canales (vecinos) en un solo round trip.
+        - Serializa el payload una única vez (una por codec si hay vecinos binarios).
+        - mode: "pipeline" (default de settings), "multi" (MULTI/EXEC atómico) o "lua".
+        Devuelve {canal: suscriptores} por cada canal pedido (el lógico, aunque vaya a su .ctrl).
         """
-        tasks = [self.publish(ch, message) for ch in neighbor_channels]
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=False)
+        if not self._client:
+            raise RuntimeError("Transport no conectado")
+        channels: List[str] = list(dict.fromkeys(neighbor_channels))  # sin duplicados, en orden
+        if not channels:
+            return {}
+
+        mode = mode or self.settings.broadcast_mode
+        result = await publish_many(self._client, self._encode_groups(channels, message), mode,
+                                    self._broadcast_script)
+        self.log.debug(f"BROADCAST[{mode}] → {result}")
+        return result
 
     # ------------- receive -------------
 
-    async def read_loop(self, poll_interval: float = 0.05) -> AsyncIterator[str]:
+    async def read_batches(self, max_batch: int = 64, max_wait: float = 0.0) -> AsyncIterator[List[Wire]]:
         """
-        Iterador async que entrega payloads crudos (str) recibidos por PubSub.
-        - Devuelve sólo los mensajes 'message' (no 'subscribe', etc.)
-        - El consumidor puede parsear JSON cuando lo necesite.
+        Iterador async orientado a eventos que entrega lotes de payloads crudos.
+        - Bloquea en el socket hasta que llega un mensaje (sin polling: en reposo solo
+          despierta cada health_check_interval para el PING de salud).
+        - Al despertar, drena en una pasada todo lo que ya esté en buffer (hasta max_batch).
+        - Si max_wait > 0, espera hasta max_wait segundos más para completar el lote.
+        - Cada lote sale del PriorityInbox: control primero, datos con su parte garantizada.
         """
         if not self._pubsub:
             raise RuntimeError("Transport no conectado")
 
-        while not self._closed:
-            try:
-                msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=poll_interval)
-                if msg is None:
-                    continue
-                # msg: {'type':'message','pattern':None,'channel':'sec10.topo1.A','data':'...'}
-                data = msg.get("data")
-                if data is None:
-                    continue
-                yield data
-            except asyncio.CancelledError:
-                break
-            except Exception as exc:
-                self.log.error(f"Error en read_loop: {exc}")
-                await asyncio.sleep(0.2)
-
-    # ------------- helpers -------------
-
-    @staticmethod
-    def channel_name(section: str, topo: str, node: str) -> str:
-        """
-        Helper para mantener el patrón SECTION.TOPO.NODE
-        """
-        return f"{section}.{topo}.{node}"
+        if not self._pumps:
+            self._pumps.append(asyncio.create_task(self._pump(self._pubsub, self._inbox, max_batch)))
+            if self._ctrl_pubsub:
+                self._pumps.append(asyncio.create_task(
+                    self._pump(self._ctrl_pubsub, self._inbox.control_lane, max_batch)))
+        async for batch in self._inbox.batches(max_batch, max_wait):
+            yield batch
+
+    async def _pump(self, pubsub: redis.client.PubSub, lane, max_batch: int) -> None:
+        """Lector de fondo: socket → carril. Con el carril de datos lleno deja de leer."""
+        idle_timeout = max(self.settings.health_check_interval, 1.0)
+        async for msgs in pubsub_batches(pubsub, lambda: self._closed, self.log, idle_timeout, max_batch):
+            # msg: {'type':'message','pattern':None,'channel':'sec10.topo1.A','data':'...'}
+            for m in msgs:
+                data = m.get("data")
+                if data is not None:
+                    await lane.put(data)
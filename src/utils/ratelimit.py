@@ -0,0 +1,66 @@
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket clásico: 'rate' tokens/s, hasta 'burst' acumulados.
+    rate <= 0 → sin límite (take() siempre True).
+    Recarga perezosa en take() (reloj monotónico), sin tareas de fondo.
+    """
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: Optional[float] = None) -> None:
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst  # arranca lleno
+        self.stamp = time.monotonic() if now is None else now
+
+    def take(self, n: float = 1.0, now: Optional[float] = None) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.stamp
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.stamp = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+
+class BucketMap:
+    """
+    Un TokenBucket por clave (vecino, (vecino, tipo), destino, ...), creado al primer uso.
+    Acotado a 'max_keys': al pasarse se descarta el menos usado recientemente. Un bucket
+    descartado vuelve lleno, así que solo se olvida el crédito de claves ociosas.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 4096) -> None:
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max(1, int(max_keys))
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def take(self, key: Hashable, n: float = 1.0, now: Optional[float] = None) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        b = self._buckets.get(key)
+        if b is None:
+            b = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return b.take(n, now)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
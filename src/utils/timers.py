@@ -0,0 +1,88 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class ExpiryScheduler:
+    """
+    Planificador central de vencimientos (heap de deadlines sobre el reloj del loop).
+    - arm(key, delay): (re)programa el vencimiento de 'key'; re-armar reemplaza al anterior
+    - cancel(key): lo quita
+    - un solo TimerHandle del loop apunta siempre al deadline más cercano; al vencer,
+      se llama on_expire(key) para cada clave vencida (en el deadline exacto, sin polling)
+
+    Re-armar es O(log n): la entrada vieja queda en el heap y se descarta al salir
+    (se compara contra el deadline vigente de la clave).
+    """
+
+    def __init__(self, on_expire: Callable[[Hashable], None]) -> None:
+        self.on_expire = on_expire
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._deadline: Dict[Hashable, float] = {}   # clave -> deadline vigente
+        self._counter = itertools.count()             # desempate estable en el heap
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._handle_at: Optional[float] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ------------- API -------------
+
+    def arm(self, key: Hashable, delay: float) -> None:
+        loop = self._get_loop()
+        when = loop.time() + max(0.0, delay)
+        self._deadline[key] = when
+        heapq.heappush(self._heap, (when, next(self._counter), key))
+        if self._handle_at is None or when < self._handle_at:
+            self._reschedule(when)
+
+    def cancel(self, key: Hashable) -> None:
+        # la entrada del heap queda huérfana y se ignora al salir
+        self._deadline.pop(key, None)
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        return self._deadline.get(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadline
+
+    def __len__(self) -> int:
+        return len(self._deadline)
+
+    def close(self) -> None:
+        if self._handle:
+            self._handle.cancel()
+        self._handle = None
+        self._handle_at = None
+        self._heap.clear()
+        self._deadline.clear()
+
+    # ------------- internals -------------
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.get_running_loop()
+        return self._loop
+
+    def _reschedule(self, when: float) -> None:
+        if self._handle:
+            self._handle.cancel()
+        self._handle_at = when
+        self._handle = self._get_loop().call_at(when, self._fire)
+
+    def _fire(self) -> None:
+        self._handle = None
+        self._handle_at = None
+        now = self._get_loop().time()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            when, _, key = heapq.heappop(heap)
+            if self._deadline.get(key) != when:
+                continue  # re-armada o cancelada
+            del self._deadline[key]
+            self.on_expire(key)
+        # descartar huérfanas en la cabeza antes de programar el próximo disparo
+        while heap and self._deadline.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+        if heap and (self._handle_at is None or heap[0][0] < self._handle_at):
+            self._reschedule(heap[0][0])
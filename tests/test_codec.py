@@ -0,0 +1,30 @@
+import json
+
+from src.protocol import codec as wire
+from src.transport.base import PriorityInbox, is_control
+
+
+def _pkt(type_, payload):
+    return {"proto": "lsr", "type": type_, "from": "A", "to": "B", "ttl": 5,
+            "headers": [], "payload": payload, "msg_id": "m1", "timestamp": 1.0}
+
+
+def test_peek_type_reads_only_the_top_level_header():
+    evil = _pkt("message", {"type": "info", "text": '"type": "hello"'})
+    assert wire.peek_type(json.dumps(evil)) == "message"
+    assert wire.peek_type(json.dumps(evil).encode("utf-8")) == "message"
+    assert wire.peek_type(wire.encode(evil, wire.BINARY)) == "message"
+    # "type" después del payload (otro orden de claves)
+    late = {"payload": {"type": "info", "x": ["{", "}"]}, "type": "hello"}
+    assert wire.peek_type(json.dumps(late)) == "hello"
+    assert wire.peek_type('{"a": "type", "b": 1}') is None
+    assert wire.peek_type("no es json") is None
+
+
+def test_data_message_with_control_like_payload_stays_in_data_lane():
+    inbox = PriorityInbox(data_maxsize=1)
+    msg = json.dumps(_pkt("message", {"type": "info"}))
+    assert not is_control(msg)
+    inbox.put_nowait(msg)
+    inbox.put_nowait(json.dumps(_pkt("hello", None)))
+    assert len(inbox._data) == 1 and len(inbox._ctrl) == 1
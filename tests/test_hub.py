@@ -0,0 +1,10 @@
+from src.transport.hub import TransportHub
+from src.transport.redis_transport import RedisSettings
+
+
+def test_shared_hub_keyed_by_full_settings():
+    base = TransportHub.shared(RedisSettings("redis.test"), pattern="sec.*")
+    assert TransportHub.shared(RedisSettings("redis.test"), pattern="sec.*") is base
+    assert TransportHub.shared(RedisSettings("redis.test", codec="binary"), pattern="sec.*") is not base
+    assert TransportHub.shared(RedisSettings("redis.test", password="s3cret"), pattern="sec.*") is not base
+    assert TransportHub.shared(RedisSettings("redis.test"), pattern="otro.*") is not base
@@ -0,0 +1,73 @@
+import random
+
+from src.services.routing_engine import IncrementalSPF, loop_free_alternates, shortest_paths
+
+
+def _random_graph(rnd: random.Random, n: int, edges: int):
+    g = {str(i): {} for i in range(n)}
+    for _ in range(edges):
+        u, v = rnd.sample(list(g), 2)
+        w = float(rnd.choice([1, 2, 3]))
+        g[u][v] = w
+        g[v][u] = w
+    return g
+
+
+def _mutate(rnd: random.Random, g):
+    """Borra, agrega o cambia el costo de una arista (simétrica); devuelve los nodos tocados."""
+    u, v = rnd.sample(list(g), 2)
+    op = rnd.random()
+    if op < 0.4 and v in g[u]:
+        del g[u][v]
+        del g[v][u]
+    else:
+        w = float(rnd.choice([1, 2, 3]))
+        g[u][v] = w
+        g[v][u] = w
+    return {u, v}
+
+
+def _copy(g):
+    return {u: dict(e) for u, e in g.items()}
+
+
+def test_incremental_matches_full_spf():
+    for seed in range(150):
+        rnd = random.Random(seed)
+        g = _random_graph(rnd, 10, 16)
+        spf = IncrementalSPF("0", full_ratio=1.0)
+        spf.update(_copy(g))
+        for _ in range(8):
+            touched = _mutate(rnd, g)
+            before = dict(spf.result.next_hops)
+            changed = spf.update(_copy(g), touched)
+            full = shortest_paths(g, "0")
+            res = spf.result
+            assert res.dist == full.dist, seed
+            assert res.next_hop == full.next_hop, seed
+            assert res.next_hops == full.next_hops, seed
+            after = res.next_hops
+            assert changed == {d for d in set(before) | set(after) if before.get(d) != after.get(d)}, seed
+
+
+def test_ecmp_hops_after_edge_removal():
+    # 0 — 4 directo (1) y también 0 — 3 — 4 (1+1 = 2 > 1); al borrar 0—4 el único camino es por 3
+    g = {"0": {"3": 1.0, "4": 1.0}, "3": {"0": 1.0, "4": 1.0}, "4": {"0": 1.0, "3": 1.0}}
+    spf = IncrementalSPF("0", full_ratio=1.0)
+    spf.update(_copy(g))
+    del g["0"]["4"]
+    del g["4"]["0"]
+    spf.update(_copy(g), {"0", "4"})
+    assert spf.result.next_hops["4"] == ("3",)
+
+
+def test_lfa_is_loop_free():
+    for seed in range(30):
+        rnd = random.Random(seed)
+        g = _random_graph(rnd, 12, 25)
+        res = shortest_paths(g, "0")
+        for dst, alt in loop_free_alternates(g, res).items():
+            assert alt in g["0"] and alt not in res.next_hops[dst]
+            da = shortest_paths(g, alt)
+            assert da.dist[dst] < da.dist["0"] + res.dist[dst]
+            assert "0" not in da.path(dst)[1:]
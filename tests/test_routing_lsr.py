@@ -0,0 +1,99 @@
+import asyncio
+
+from src.services.routing_lsr import LSRConfig, RoutingLSRService
+from src.storage.state import State
+from src.transport.loopback import LoopbackBus, LoopbackTransport
+
+
+class SlowTransport(LoopbackTransport):
+    """Loopback cuyo broadcast tarda: el SPF queda a mitad de corrida en _advertise_info()."""
+
+    def __init__(self, *args, delay: float = 0.3, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+
+    async def broadcast(self, neighbor_channels, message):
+        await asyncio.sleep(self.delay)
+        return await super().broadcast(neighbor_channels, message)
+
+
+async def _make_lsr(transport) -> RoutingLSRService:
+    state = State("A")
+    await state.set_neighbors([("B", 1.0)])
+    cfg = LSRConfig(hello_timeout_sec=30.0, info_interval_sec=60.0,
+                    spf_initial_delay_sec=0.01, spf_hold_sec=0.05, spf_max_hold_sec=0.1, lfa=False)
+    lsr = RoutingLSRService(state, transport, "A", {"B": "B"}, cfg)
+    await lsr.start()
+    await state.touch_hello("B")
+    return lsr
+
+
+def test_change_during_running_spf_is_not_lost():
+    async def main():
+        transport = SlowTransport("A", bus=LoopbackBus())
+        await transport.connect()
+        lsr = await _make_lsr(transport)
+        try:
+            await lsr.on_info("B", {"A": 1.0, "C": 1.0}, seq=1)
+            await asyncio.sleep(0.05)           # corrida 1 en marcha, trabada en el broadcast
+            assert lsr._spf_task is not None and not lsr._spf_task.done()
+            await lsr.on_info("C", {"B": 1.0, "D": 1.0}, seq=1)
+            await lsr.on_info("D", {"C": 1.0}, seq=1)
+            for _ in range(100):
+                if lsr.state.next_hop("D") == "B":
+                    break
+                await asyncio.sleep(0.02)
+            assert lsr.state.next_hop("C") == "B"
+            assert lsr.state.next_hop("D") == "B"
+            assert lsr.spf_executed >= 2
+        finally:
+            await lsr.stop()
+            await transport.close()
+
+    asyncio.run(main())
+
+
+def test_lfa_only_recomputed_when_own_tree_changes(monkeypatch):
+    from src.services import routing_lsr
+
+    calls = []
+    real = routing_lsr.loop_free_alternates
+
+    def counting(graph, res):
+        calls.append(res.src)
+        return real(graph, res)
+
+    monkeypatch.setattr(routing_lsr, "loop_free_alternates", counting)
+
+    async def main():
+        transport = LoopbackTransport("A", bus=LoopbackBus())
+        await transport.connect()
+        state = State("A")
+        await state.set_neighbors([("B", 1.0), ("C", 1.0)])
+        await state.touch_hello("B")
+        await state.touch_hello("C")
+        lsr = RoutingLSRService(state, transport, "A", {"B": "B", "C": "C"},
+                                LSRConfig(hello_timeout_sec=30.0))
+        await state.update_lsdb("B", {"A": 1.0, "D": 1.0}, seq=1)
+        await state.update_lsdb("C", {"A": 1.0, "D": 2.0}, seq=1)
+        await state.update_lsdb("D", {"B": 1.0, "C": 2.0}, seq=1)
+        await lsr._recompute_routes()
+        assert len(calls) == 1
+        assert state.routing.alternates == {"D": "C"}
+
+        # C—D empeora: no está en mi árbol (D sigue por B, a 2) → LFA sin recalcular
+        await state.update_lsdb("C", {"A": 1.0, "D": 3.0}, seq=2)
+        await state.update_lsdb("D", {"B": 1.0, "C": 3.0}, seq=2)
+        await lsr._recompute_routes()
+        assert len(calls) == 1
+        assert state.routing.alternates == {"D": "C"}
+
+        # B—D desaparece: cambia mi árbol → se recalculan
+        await state.update_lsdb("B", {"A": 1.0}, seq=2)
+        await state.update_lsdb("D", {"C": 3.0}, seq=3)
+        await lsr._recompute_routes()
+        assert len(calls) == 2
+        assert state.next_hop("D") == "C"
+        await transport.close()
+
+    asyncio.run(main())
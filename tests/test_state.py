@@ -0,0 +1,59 @@
+import asyncio
+
+from src.storage.state import NEIGHBOR_UP, State
+
+
+def test_neighbor_down_then_hello_brings_it_back():
+    async def main():
+        state = State("A")
+        await state.set_neighbors([("B", 2.0)])
+        state.enable_liveness(30.0)
+        ups = []
+
+        async def on_up(n):
+            ups.append(n)
+
+        state.on_event(NEIGHBOR_UP, on_up)
+        await state.touch_hello("B")
+        assert "B" in state.alive and ups == []   # enlace configurado: no es una vuelta
+
+        await state.mark_neighbor_down("B")
+        assert "B" not in state.alive
+        assert "B" not in state.lsdb["A"]
+        assert "B" in state.neighbors              # sigue configurado
+
+        await state.touch_hello("B")
+        await asyncio.sleep(0)
+        assert "B" in state.alive
+        assert state.lsdb["A"] == {"B": 2.0}
+        assert await state.get_alive_links(30.0) == {"B": 2.0}
+        assert ups == ["B"]
+        state.disable_liveness()
+
+    asyncio.run(main())
+
+
+def test_withdrawn_lsp_flushes_origin_and_keeps_seq():
+    from src.storage.state import LSP_NEW, LSP_STALE, LSP_WITHDRAWN
+
+    async def main():
+        state = State("A")
+        assert await state.update_lsdb("X", {"Y": 1.0}, seq=5) == LSP_NEW
+        assert await state.update_lsdb("X", {}, seq=6, withdrawn=True) == LSP_WITHDRAWN
+        assert "X" not in state.lsdb
+        assert await state.update_lsdb("X", {"Y": 1.0}, seq=5) == LSP_STALE   # copia vieja en vuelo
+        assert await state.update_lsdb("X", {"Y": 1.0}, seq=7) == LSP_NEW     # reinicio
+
+    asyncio.run(main())
+
+
+def test_routing_table_costs_come_from_the_published_snapshot():
+    async def main():
+        state = State("A")
+        await state.set_routing_table({"B": "B", "C": "B"}, costs={"A": 0.0, "B": 1.0, "C": 3.0})
+        table = await state.get_routing_table()
+        assert table == {"B": {"next_hop": "B", "cost": 1.0}, "C": {"next_hop": "B", "cost": 3.0}}
+        snap = await state.export_snapshot()
+        assert snap["costs"] == {"B": 1.0, "C": 3.0}
+
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+from src.protocol.builders import build_hello, build_message
+from src.transport.loopback import LoopbackBus, LoopbackTransport
+from src.transport.redis_transport import publish_many
+
+
+class _Pipe:
+    def __init__(self, published):
+        self.published = published
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def publish(self, ch, payload):
+        self.published.append(ch)
+
+    async def execute(self):
+        return [1] * len(self.published)
+
+
+class _Client:
+    """Cliente mínimo: registra a qué canal físico se publicó."""
+
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, ch, payload):
+        self.published.append(ch)
+        return 1
+
+    def pipeline(self, transaction=False):
+        return _Pipe(self.published)
+
+
+def test_broadcast_result_is_keyed_by_logical_channel():
+    async def main():
+        bus = LoopbackBus()
+        t = LoopbackTransport("A", bus=bus)
+        await t.connect()
+        queues = {ch: asyncio.Queue() for ch in ("B", "B.ctrl", "C")}
+        for ch, q in queues.items():
+            bus.subscribe(ch, q)
+        t.set_channel_control("B", True)
+
+        assert await t.broadcast(["B", "C"], build_hello("A").to_publish_dict()) == {"B": 1, "C": 1}
+        assert queues["B.ctrl"].qsize() == 1 and queues["B"].qsize() == 0
+        assert await t.broadcast(["B"], build_message("A", "B", "hola").to_publish_dict()) == {"B": 1}
+        assert queues["B"].qsize() == 1
+
+        client = _Client()
+        groups = t._encode_groups(["B", "C"], build_hello("A").to_publish_dict())
+        assert await publish_many(client, groups, "pipeline") == {"B": 1, "C": 1}
+        assert client.published == ["B.ctrl", "C"]
+        await t.close()
+
+    asyncio.run(main())
+
+
+def test_shared_producers_drop_excess_data_but_never_control():
+    from src.transport.base import PriorityInbox
+
+    inbox = PriorityInbox(data_maxsize=2)
+    data = build_message("A", "B", "x").to_publish_dict()
+    hello = build_hello("A").to_publish_dict()
+    assert inbox.put_nowait(json.dumps(data)) and inbox.put_nowait(json.dumps(data))
+    assert not inbox.put_nowait(json.dumps(data))
+    assert inbox.dropped == 1
+    assert inbox.put_nowait(json.dumps(hello))          # control pasa igual
+    assert len(inbox._data) == 2 and len(inbox._ctrl) == 1
+
+
+def test_loopback_inbox_is_bounded():
+    async def main():
+        bus = LoopbackBus()
+        rx = LoopbackTransport("B", bus=bus, data_queue_depth=3)
+        await rx.connect()
+        tx = LoopbackTransport("A", bus=bus)
+        await tx.connect()
+        for _ in range(10):
+            await tx.publish("B", build_message("A", "B", "x").to_publish_dict())
+        assert len(rx._queue) == 3 and rx._queue.dropped == 7
+        await rx.close()
+        await tx.close()
+
+    asyncio.run(main())